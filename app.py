@@ -1,11 +1,21 @@
+import time
+# Measured from the first line so the boot log covers dependency imports
+BOOT_STARTED = time.perf_counter()
+
 import os
+import math
 import json
 import logging
 import asyncio
+import threading
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort
+from flask import (
+    Flask, render_template, request, redirect, url_for, flash, jsonify, abort, send_file,
+    send_from_directory, g
+)
 from werkzeug.utils import secure_filename
-from flask_wtf.csrf import CSRFProtect
+from werkzeug.wsgi import ClosingIterator
+from flask_wtf.csrf import CSRFProtect, generate_csrf
 from flask_cors import CORS
 import psutil
 from flask_apscheduler import APScheduler
@@ -18,15 +28,25 @@ load_dotenv()
 from file_manager import (
     get_file_hash, async_get_file_hash, create_directory_if_not_exists,
     generate_filelist, save_filelist, load_file_status, save_file_status, 
-    update_file_status, generate_patchlist_from_status, delete_file
+    update_file_status, generate_patchlist_from_status, delete_file,
+    finalize_uploads, rescan_file_status, verify_file_status, CATALOG_FOLDERS
 )
+from job_queue import JobManager
+from log_setup import setup_logging
+from leader import LeaderLock
+from manifest import MANIFEST_MIMETYPE
+from integrity import run_verification_slice, load_verification_state
+from releases import ReleaseStore, RELEASE_PATCHLIST, RELEASE_MANIFEST
+from rate_limit import AdmissionController, Rejection
+import shutil
 
-# Configure logging
-logging.basicConfig(
-    filename='patcher_server.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
+# Configure logging: records are queued and written by a background thread
+setup_logging(
+    os.environ.get('LOG_FILE', 'patcher_server.log'),
+    level=getattr(logging, os.environ.get('LOG_LEVEL', 'INFO').upper(), logging.INFO),
+    json_format=os.environ.get('LOG_FORMAT', 'json').lower() == 'json',
+    sample_rate=int(os.environ.get('LOG_SAMPLE_RATE', 100)),
+    extra_files={'file_manager': 'file_manager.log'}
 )
 logger = logging.getLogger(__name__)
 
@@ -35,7 +55,30 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'change_this_in_production')
 app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join('static', 'uploads'))
 app.config['PATCHLIST_FILE'] = os.environ.get('PATCHLIST_FILE', 'patcher.txt')
+app.config['PATCHLIST_MANIFEST'] = os.environ.get('PATCHLIST_MANIFEST', 'patcher.bin')
 app.config['FILE_STATUS'] = os.environ.get('FILE_STATUS', 'file_status.json')
+app.config['RELEASES_DIR'] = os.environ.get('RELEASES_DIR', 'releases')
+app.config['RELEASE_RETENTION'] = int(os.environ.get('RELEASE_RETENTION', 10))
+app.config['PRELOAD_APP'] = os.environ.get('PRELOAD_APP', 'false').lower() == 'true'
+app.config['LEADER_LOCK_FILE'] = os.environ.get('LEADER_LOCK_FILE', 'scheduler.lock')
+app.config['JOBS_FILE'] = os.environ.get('JOBS_FILE', 'jobs.json')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['INTEGRITY_STATE_FILE'] = os.environ.get('INTEGRITY_STATE_FILE', 'integrity_state.json')
+app.config['INTEGRITY_INTERVAL'] = int(os.environ.get('INTEGRITY_INTERVAL', 600))  # seconds between slices
+app.config['INTEGRITY_SLICE_SECONDS'] = int(os.environ.get('INTEGRITY_SLICE_SECONDS', 60))
+app.config['INTEGRITY_BYTES_PER_SEC'] = int(os.environ.get('INTEGRITY_BYTES_PER_SEC', 10 * 1024 * 1024))
+app.config['INTEGRITY_ACTION'] = os.environ.get('INTEGRITY_ACTION', 'flag')  # 'flag' or 'disable'
+app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+app.config['RATE_LIMIT_MODE'] = os.environ.get('RATE_LIMIT_MODE', 'queue')  # 'queue' or 'reject'
+app.config['RATE_LIMIT_QUEUE_TIMEOUT'] = float(os.environ.get('RATE_LIMIT_QUEUE_TIMEOUT', 10))
+app.config['RATE_LIMIT_MAX_QUEUE'] = int(os.environ.get('RATE_LIMIT_MAX_QUEUE', 6))  # waiting requests per worker
+app.config['RATE_LIMIT_PER_IP_RATE'] = float(os.environ.get('RATE_LIMIT_PER_IP_RATE', 5))  # requests/sec
+app.config['RATE_LIMIT_PER_IP_BURST'] = float(os.environ.get('RATE_LIMIT_PER_IP_BURST', 20))
+app.config['RATE_LIMIT_PER_IP_CONCURRENCY'] = int(os.environ.get('RATE_LIMIT_PER_IP_CONCURRENCY', 4))
+app.config['RATE_LIMIT_GLOBAL_CONCURRENCY'] = int(os.environ.get('RATE_LIMIT_GLOBAL_CONCURRENCY', 24))  # keep below WORKER_THREADS
+app.config['BANDWIDTH_PER_IP'] = int(os.environ.get('BANDWIDTH_PER_IP', 0))  # bytes/sec, 0 = unlimited
+app.config['BANDWIDTH_GLOBAL'] = int(os.environ.get('BANDWIDTH_GLOBAL', 0))  # bytes/sec, 0 = unlimited
+app.config['RATE_LIMIT_TRUST_PROXY'] = os.environ.get('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max upload size
 app.config['ALLOWED_EXTENSIONS'] = {'epk', 'eix', 'txt', 'zip', 'rar', 'tar', 'gz', 'bin', 'dat'}
 
@@ -43,16 +86,121 @@ app.config['ALLOWED_EXTENSIONS'] = {'epk', 'eix', 'txt', 'zip', 'rar', 'tar', 'g
 csrf = CSRFProtect(app)
 CORS(app)
 
-# Initialize scheduler for background tasks
+# Scheduler for periodic tasks; only the leader process starts it (see start_background_services)
 scheduler = APScheduler()
 scheduler.init_app(app)
-scheduler.start()
+leader_lock = LeaderLock(app.config['LEADER_LOCK_FILE'])
+LEADER_RETRY_INTERVAL = 30  # seconds between election attempts in non-leader processes
+_last_election = None
+
+# Background job pool, created on first use so each forked worker gets its own threads
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+# psutil disk sampling is cached; dashboards and status polls don't need fresher numbers
+DISK_STATS_TTL = 5  # seconds
+_disk_stats = (None, 0.0)
+
+# Admission control for patch-day download surges
+admission = AdmissionController(
+    per_ip_rate=app.config['RATE_LIMIT_PER_IP_RATE'],
+    per_ip_burst=app.config['RATE_LIMIT_PER_IP_BURST'],
+    per_ip_concurrency=app.config['RATE_LIMIT_PER_IP_CONCURRENCY'],
+    global_concurrency=app.config['RATE_LIMIT_GLOBAL_CONCURRENCY'],
+    mode=app.config['RATE_LIMIT_MODE'],
+    queue_timeout=app.config['RATE_LIMIT_QUEUE_TIMEOUT'],
+    global_bandwidth=app.config['BANDWIDTH_GLOBAL'],
+    per_ip_bandwidth=app.config['BANDWIDTH_PER_IP'],
+    max_queue=app.config['RATE_LIMIT_MAX_QUEUE'],
+)
+
+# Published catalog snapshots; the file status is the draft
+release_store = ReleaseStore(app.config['RELEASES_DIR'], app.config['UPLOAD_FOLDER'], app.config['RELEASE_RETENTION'])
+
+def mirror_release(release_id):
+    """Copy a release's patchlist files to the configured live paths."""
+    for name, target in ((RELEASE_PATCHLIST, app.config['PATCHLIST_FILE']),
+                         (RELEASE_MANIFEST, app.config['PATCHLIST_MANIFEST'])):
+        temp_file = f"{target}.tmp"
+        shutil.copyfile(release_store.path(release_id, name), temp_file)
+        shutil.move(temp_file, target)
+
+def publish_release(file_status, note='', progress_callback=None):
+    """Publish a catalog snapshot and make it the served release."""
+    release = release_store.publish(file_status, note, progress_callback)
+    mirror_release(release['id'])
+    return release
+
+def disable_in_current_release(filenames):
+    """Publish the served release again with the given entries switched OFF."""
+    file_status = release_store.current_status()
+    for filename in filenames:
+        if filename in file_status:
+            file_status[filename]['status'] = 'OFF'
+    publish_release(file_status, note=f"Integrity auto-disable: {', '.join(filenames)}")
 
 def allowed_file(filename):
     """Check if a file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-@app.before_first_request
+def is_download_request():
+    """True for requests served to patch clients: patchlist and patch files."""
+    return request.endpoint in ('serve_patchlist', 'download', 'download_upload')
+
+def client_address():
+    """Return the client IP used for per-client limits."""
+    if app.config['RATE_LIMIT_TRUST_PROXY'] and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'unknown'
+
+@app.before_request
+def admission_control():
+    """Admit, queue or shed download requests before they reach the view."""
+    if not app.config['RATE_LIMIT_ENABLED'] or not is_download_request():
+        return None
+    
+    client = client_address()
+    try:
+        g.admission_ticket = admission.admit(client)
+        g.admission_client = client
+    except Rejection as e:
+        logger.warning("Shed request from %s: %s", client, e.reason,
+                       extra={'sample': True, 'client': client, 'status_code': e.status_code})
+        retry_after = math.ceil(e.retry_after)
+        return jsonify(error=e.reason, retry_after=retry_after), e.status_code, {'Retry-After': str(retry_after)}
+    return None
+
+@app.after_request
+def release_admission(response):
+    """Hold the admission slot until the body has been sent, pacing it if configured."""
+    ticket = g.pop('admission_ticket', None)
+    if ticket is None:
+        return response
+    
+    body = response.response
+    if admission.throttles_bandwidth and response.status_code in (200, 206):
+        body = admission.throttle(body, g.admission_client)
+    # call_on_close is skipped for direct passthrough file bodies, so wrap the body itself
+    response.response = ClosingIterator(body, ticket.release)
+    return response
+
+@app.teardown_request
+def release_unhandled_admission(exc):
+    """Free the admission slot if the view failed before producing a response."""
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        ticket.release()
+
+def disk_usage():
+    """Return psutil disk usage for '/', sampled at most every DISK_STATS_TTL seconds."""
+    global _disk_stats
+    stats, sampled = _disk_stats
+    now = time.monotonic()
+    if stats is None or now - sampled > DISK_STATS_TTL:
+        stats = psutil.disk_usage('/')
+        _disk_stats = (stats, now)
+    return stats
+
 def setup_directories():
     """Ensure required directories exist."""
     try:
@@ -61,24 +209,142 @@ def setup_directories():
         create_directory_if_not_exists(os.path.join(app.config['UPLOAD_FOLDER'], 'main'))
         create_directory_if_not_exists(os.path.join(app.config['UPLOAD_FOLDER'], 'pack'))
         
-        # Generate initial patchlist if needed
-        if not os.path.exists(app.config['PATCHLIST_FILE']):
+        # Publish an initial release if needed. If the catalog lists files that
+        # aren't on disk, wait for an explicit publish rather than serve a
+        # shrunken list; PATCHLIST_FILE is served until then.
+        if release_store.current_id() is None:
             file_status = load_file_status(app.config['FILE_STATUS'])
-            generate_patchlist_from_status(file_status, app.config['PATCHLIST_FILE'])
+            missing = release_store.missing_files(file_status)
+            if missing:
+                logger.warning("Initial release not published, %s catalog files are missing: %s",
+                               len(missing), ', '.join(missing))
+            else:
+                publish_release(file_status, note='Initial release')
+        else:
+            # Releases published before files were snapshotted have no stored copies yet
+            copied, missing = release_store.store_objects(release_store.current_status())
+            if copied:
+                logger.info("Stored %s files of the current release", copied)
+            if missing:
+                logger.warning("%s files of the current release are missing and can't be served: %s",
+                               len(missing), ', '.join(missing))
             
         logger.info("Application initialized successfully")
     except Exception as e:
-        logger.error(f"Error in setup: {str(e)}")
+        logger.error("Error in setup: %s", e)
+
+def job_publish(ctx, note=''):
+    """Job: freeze the draft catalog into a release and serve it."""
+    file_status = load_file_status(app.config['FILE_STATUS'])
+    release = publish_release(file_status, note, ctx.step)
+    return {'release': release['id'], 'files': release['files'], 'skipped': release.get('skipped', [])}
 
-@scheduler.task('interval', id='regenerate_patchlist', seconds=300)
-def scheduled_patchlist_regeneration():
-    """Automatically regenerate patchlist every 5 minutes."""
+def job_rescan(ctx):
+    """Job: re-hash all files on disk into the draft catalog."""
+    file_status = rescan_file_status(
+        app.config['UPLOAD_FOLDER'], app.config['FILE_STATUS'], ctx.step
+    )
+    return {'files': len(file_status)}
+
+def job_finalize_upload(ctx, entries):
+    """Job: hash freshly uploaded files and record them in the draft catalog."""
+    finalize_uploads(entries, 'ON', app.config['FILE_STATUS'], ctx.step)
+    return {'files': len(entries)}
+
+def job_verify(ctx):
+    """Job: check the served release's stored files and the draft files against their hashes."""
+    served = {name: details for name, details in release_store.current_status().items()
+              if details.get('status') == 'ON'}
+    draft = load_file_status(app.config['FILE_STATUS'])
+    total = len(served) + len(draft)
+    
+    mismatches = [
+        dict(m, source='release') for m in verify_file_status(
+            served, app.config['UPLOAD_FOLDER'], lambda done, _: ctx.step(done, total),
+            release_store.object_path
+        )
+    ]
+    mismatches += [
+        dict(m, source='draft') for m in verify_file_status(
+            draft, app.config['UPLOAD_FOLDER'], lambda done, _: ctx.step(len(served) + done, total)
+        )
+    ]
+    return {'checked': total, 'mismatches': mismatches}
+
+def get_job_manager():
+    """Return the process's job manager, creating it on first use."""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                manager = JobManager(app.config['JOBS_FILE'], max_workers=app.config['JOB_WORKERS'])
+                manager.register('publish', job_publish, unique=True)
+                manager.register('rescan', job_rescan, unique=True)
+                manager.register('finalize_upload', job_finalize_upload)
+                manager.register('verify', job_verify, unique=True)
+                _job_manager = manager
+    return _job_manager
+
+def start_background_services():
+    """
+    Start the scheduler if this process wins the leader election.
+    
+    Only one process across all workers runs periodic tasks. Non-leaders
+    retry at most every LEADER_RETRY_INTERVAL seconds, so another worker
+    takes over when the leader exits.
+    """
+    global _last_election
+    if leader_lock.is_leader:
+        return
+    now = time.monotonic()
+    if _last_election is not None and now - _last_election < LEADER_RETRY_INTERVAL:
+        return
+    _last_election = now
+    
     try:
-        file_status = load_file_status(app.config['FILE_STATUS'])
-        generate_patchlist_from_status(file_status, app.config['PATCHLIST_FILE'])
-        logger.info("Scheduled patchlist regeneration completed")
+        if leader_lock.try_acquire() and not scheduler.running:
+            scheduler.start()
+            logger.info("Process %s is the scheduler leader", os.getpid())
     except Exception as e:
-        logger.error(f"Error in scheduled patchlist regeneration: {str(e)}")
+        logger.error("Error starting background services: %s", e)
+
+def prewarm():
+    """
+    One-time startup work. Under gunicorn --preload this runs once in the
+    master, so workers inherit the result instead of repeating it.
+    """
+    setup_directories()
+    # Compile templates now so forked workers share them
+    for template in ('dashboard.html', 'error.html'):
+        app.jinja_env.get_template(template)
+
+@app.before_request
+def ensure_background_services():
+    """Retry the scheduler election lazily in non-leader processes."""
+    start_background_services()
+
+def job_response(job, status_code=202):
+    """Build the JSON response for a newly submitted job."""
+    return jsonify(
+        success=True,
+        job_id=job['id'],
+        status=job['status'],
+        status_url=url_for('job_status', job_id=job['id']),
+        cancel_url=url_for('cancel_job', job_id=job['id'])
+    ), status_code
+
+@scheduler.task('interval', id='verify_integrity', seconds=app.config['INTEGRITY_INTERVAL'])
+def scheduled_integrity_verification():
+    """Re-hash the next slice of the catalog within the configured I/O budget."""
+    try:
+        run_verification_slice(
+            app.config['FILE_STATUS'], app.config['UPLOAD_FOLDER'],
+            app.config['INTEGRITY_STATE_FILE'],
+            app.config['INTEGRITY_BYTES_PER_SEC'], app.config['INTEGRITY_SLICE_SECONDS'],
+            app.config['INTEGRITY_ACTION'], disable_in_current_release, release_store
+        )
+    except Exception as e:
+        logger.error("Error in scheduled integrity verification: %s", e)
 
 @app.route('/')
 def home():
@@ -92,7 +358,7 @@ def dashboard():
         file_status = load_file_status(app.config['FILE_STATUS'])
         
         # Get system stats
-        disk = psutil.disk_usage('/')
+        disk = disk_usage()
         disk_percent = disk.percent
         total_space = disk.total // (1024 * 1024 * 1024)  # GB
         free_space = disk.free // (1024 * 1024 * 1024)  # GB
@@ -103,6 +369,8 @@ def dashboard():
             'free_space': free_space,
             'total_files': len(file_status),
             'active_files': sum(1 for f in file_status.values() if f.get('status') == 'ON'),
+            'current_release': release_store.current_id(),
+            'draft_pending': file_status != release_store.current_status(),
         }
         
         return render_template(
@@ -111,7 +379,7 @@ def dashboard():
             system_stats=system_stats
         )
     except Exception as e:
-        logger.error(f"Error rendering dashboard: {str(e)}")
+        logger.error("Error rendering dashboard: %s", e)
         flash(f"Error loading dashboard: {str(e)}", "error")
         return render_template('error.html', error=str(e))
 
@@ -136,9 +404,8 @@ def upload():
             upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], folder)
             create_directory_if_not_exists(upload_folder)
             
-            # Process each file
-            file_status = load_file_status(app.config['FILE_STATUS'])
-            uploaded_count = 0
+            # Save each file; hashing happens in a background job
+            saved_entries = []
             
             for file in files:
                 if file.filename == '':
@@ -148,28 +415,23 @@ def upload():
                     filename = secure_filename(file.filename)
                     filepath = os.path.join(upload_folder, filename)
                     
-                    # Save the file
-                    file.save(filepath)
-                    
-                    # Update file status
-                    file_status = update_file_status(
-                        filename, folder, filepath, 'ON', 
-                        app.config['FILE_STATUS']
-                    )
-                    uploaded_count += 1
+                    # Save under a temp name first so a publish never copies a partial file
+                    temp_file = f"{filepath}.tmp"
+                    file.save(temp_file)
+                    os.replace(temp_file, filepath)
+                    saved_entries.append({'filename': filename, 'folder': folder, 'filepath': filepath})
                 else:
                     flash(f'Skipped file with disallowed extension: {file.filename}', 'warning')
             
-            # Generate new patchlist
-            generate_patchlist_from_status(file_status, app.config['PATCHLIST_FILE'])
-            
-            if uploaded_count > 0:
-                flash(f'{uploaded_count} files successfully uploaded', 'success')
+            # Hash files and regenerate the patchlist in the background
+            if saved_entries:
+                job = get_job_manager().submit('finalize_upload', entries=saved_entries)
+                flash(f'{len(saved_entries)} files uploaded, processing in background (job {job["id"]})', 'success')
             
             return redirect(url_for('dashboard'))
             
         except Exception as e:
-            logger.error(f"Error uploading files: {str(e)}")
+            logger.error("Error uploading files: %s", e)
             flash(f"Error uploading files: {str(e)}", "error")
             return redirect(url_for('dashboard'))
             
@@ -197,13 +459,11 @@ def update_status():
         file_status[filename]['status'] = status
         save_file_status(file_status, app.config['FILE_STATUS'])
         
-        # Regenerate patchlist
-        generate_patchlist_from_status(file_status, app.config['PATCHLIST_FILE'])
-        
-        return jsonify(success=True)
+        # Takes effect for clients on the next publish
+        return jsonify(success=True, pending_publish=True)
         
     except Exception as e:
-        logger.error(f"Error updating status: {str(e)}")
+        logger.error("Error updating status: %s", e)
         return jsonify(success=False, error=str(e)), 500
 
 @app.route('/delete_file', methods=['POST'])
@@ -228,43 +488,175 @@ def delete_file_route():
         if not success:
             return jsonify(success=False, error="File deletion failed"), 404
         
-        # Regenerate patchlist
-        generate_patchlist_from_status(updated_status, app.config['PATCHLIST_FILE'])
-        
-        return jsonify(success=True)
+        # Removed from the served patchlist on the next publish
+        return jsonify(success=True, pending_publish=True)
         
     except Exception as e:
-        logger.error(f"Error deleting file: {str(e)}")
+        logger.error("Error deleting file: %s", e)
         return jsonify(success=False, error=str(e)), 500
 
+@app.route('/download/<path:filename>')
+def download(filename):
+    """Serve a patch file of the current release under admission control."""
+    if release_store.current_id() is None:
+        # Nothing published yet: serve the upload folder as before releases existed.
+        # Patchlist paths list 'main' files without their folder.
+        folder = filename.split('/', 1)[0]
+        disk_path = filename if folder in CATALOG_FOLDERS and folder != 'main' else f"main/{filename}"
+        return send_from_directory(app.config['UPLOAD_FOLDER'], disk_path, conditional=True)
+    
+    resolved = release_store.resolve(filename)
+    if resolved is None:
+        abort(404)
+    
+    path, sha256 = resolved
+    if not os.path.exists(path):
+        logger.error("Stored file for %s is missing: %s", filename, path)
+        abort(404)
+    # Files are served from the release snapshot, so the hash is a stable ETag
+    return send_file(path, download_name=os.path.basename(filename), etag=sha256,
+                     conditional=True, max_age=0)
+
+# Patch clients fetch files from the upload folder's static URL; serve the release there too
+_static_uploads = os.path.relpath(os.path.abspath(app.config['UPLOAD_FOLDER']), app.static_folder)
+if not _static_uploads.startswith(os.pardir):
+    app.add_url_rule(f"{app.static_url_path}/{_static_uploads.replace(os.sep, '/')}/<path:filename>",
+                     'download_upload', download)
+
+@app.route('/api/csrf_token')
+def csrf_token():
+    """Return a CSRF token for API clients; send it back in the X-CSRFToken header."""
+    return jsonify(csrf_token=generate_csrf())
+
+@app.route('/api/rate_limits')
+def rate_limit_metrics():
+    """Return admission control counters for this worker process."""
+    return jsonify(pid=os.getpid(), mode=app.config['RATE_LIMIT_MODE'], **admission.metrics())
+
 @app.route('/api/patchlist')
 def serve_patchlist():
-    """Serve the patchlist file."""
+    """Serve the current release's patchlist, as the binary manifest if the client accepts it."""
     try:
-        with open(app.config['PATCHLIST_FILE'], 'r') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+        release_id = release_store.current_id()
+        best = request.accept_mimetypes.best_match(['text/plain', MANIFEST_MIMETYPE])
+        if best == MANIFEST_MIMETYPE or request.args.get('format') == 'binary':
+            name, mimetype, fallback = RELEASE_MANIFEST, MANIFEST_MIMETYPE, app.config['PATCHLIST_MANIFEST']
+        else:
+            name, mimetype, fallback = RELEASE_PATCHLIST, 'text/plain', app.config['PATCHLIST_FILE']
+        
+        if release_id is None:
+            # Nothing published yet: keep serving the existing patchlist files
+            if not os.path.exists(fallback):
+                return jsonify(error="No release has been published"), 404
+            return send_file(os.path.abspath(fallback), mimetype=mimetype, conditional=True, max_age=0)
+        
+        # Release files are immutable, so the precompressed variant is always in sync
+        path = release_store.path(release_id, name)
+        gzipped = request.accept_encodings['gzip'] > 0
+        response = send_file(f"{path}.gz" if gzipped else path, mimetype=mimetype,
+                             etag=f"{release_id}-{name}{'-gz' if gzipped else ''}",
+                             conditional=True, max_age=0)
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        response.headers['X-Release-Id'] = release_id
+        return response
     except Exception as e:
-        logger.error(f"Error serving patchlist: {str(e)}")
+        logger.error("Error serving patchlist: %s", e)
         return jsonify(error=str(e)), 500
 
-@app.route('/api/regenerate_patchlist')
+@app.route('/api/regenerate_patchlist', methods=['POST'])
 def regenerate_patchlist():
-    """Force patchlist regeneration."""
+    """Queue a publish of the draft catalog (alias of /api/releases/publish for existing clients)."""
+    return publish()
+
+@app.route('/api/releases')
+def list_releases():
+    """Return retained releases and which one is served."""
     try:
-        file_status = load_file_status(app.config['FILE_STATUS'])
-        generate_patchlist_from_status(file_status, app.config['PATCHLIST_FILE'])
-        return jsonify(success=True, message="Patchlist regenerated")
+        return jsonify(current=release_store.current_id(), releases=release_store.list_releases())
+    except Exception as e:
+        logger.error("Error listing releases: %s", e)
+        return jsonify(error=str(e)), 500
+
+@app.route('/api/releases/publish', methods=['POST'])
+def publish():
+    """Queue a publish of the draft catalog as a new release."""
+    try:
+        data = request.get_json(silent=True) or {}
+        return job_response(get_job_manager().submit('publish', note=data.get('note', '')))
+    except Exception as e:
+        logger.error("Error publishing release: %s", e)
+        return jsonify(success=False, error=str(e)), 500
+
+@app.route('/api/releases/<release_id>/rollback', methods=['POST'])
+def rollback_release(release_id):
+    """Serve a previously published release again."""
+    try:
+        release = release_store.rollback(release_id)
+        mirror_release(release['id'])
+        return jsonify(success=True, release=release)
+    except KeyError:
+        return jsonify(success=False, error="Release not found"), 404
+    except Exception as e:
+        logger.error("Error rolling back release: %s", e)
+        return jsonify(success=False, error=str(e)), 500
+
+@app.route('/api/rescan', methods=['POST'])
+def rescan():
+    """Queue a full re-hash of the upload folders."""
+    try:
+        return job_response(get_job_manager().submit('rescan'))
+    except Exception as e:
+        logger.error("Error starting rescan: %s", e)
+        return jsonify(success=False, error=str(e)), 500
+
+@app.route('/api/verify', methods=['POST'])
+def verify():
+    """Queue an integrity verification of all catalog files."""
+    try:
+        return job_response(get_job_manager().submit('verify'))
     except Exception as e:
-        logger.error(f"Error regenerating patchlist: {str(e)}")
+        logger.error("Error starting verification: %s", e)
         return jsonify(success=False, error=str(e)), 500
 
+@app.route('/api/integrity')
+def integrity_status():
+    """Return the progress and findings of the periodic integrity verifier."""
+    try:
+        return jsonify(load_verification_state(app.config['INTEGRITY_STATE_FILE']))
+    except Exception as e:
+        logger.error("Error getting integrity status: %s", e)
+        return jsonify(error=str(e)), 500
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Return recent background jobs."""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(jobs=get_job_manager().list_jobs(limit))
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Return the status and progress of a background job."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Request cancellation of a background job."""
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify(success=False, error="Job not found"), 404
+    return jsonify(success=True, status=job['status'])
+
 @app.route('/api/status')
 def server_status():
     """Return server status information."""
     try:
         # Get system stats
-        disk = psutil.disk_usage('/')
+        disk = disk_usage()
         
         file_status = load_file_status(app.config['FILE_STATUS'])
         active_files = sum(1 for f in file_status.values() if f.get('status') == 'ON')
@@ -276,12 +668,17 @@ def server_status():
             'free_space_gb': disk.free // (1024 * 1024 * 1024),
             'total_files': len(file_status),
             'active_files': active_files,
+            'integrity_mismatches': len(load_verification_state(app.config['INTEGRITY_STATE_FILE'])['mismatches']),
+            'current_release': release_store.current_id(),
+            'pid': os.getpid(),
+            'boot_ms': BOOT_MS,
+            'scheduler_leader': leader_lock.is_leader,
             'patchlist_size_bytes': os.path.getsize(app.config['PATCHLIST_FILE']) if os.path.exists(app.config['PATCHLIST_FILE']) else 0
         }
         
         return jsonify(status)
     except Exception as e:
-        logger.error(f"Error getting server status: {str(e)}")
+        logger.error("Error getting server status: %s", e)
         return jsonify(error=str(e)), 500
 
 @app.errorhandler(404)
@@ -292,9 +689,20 @@ def page_not_found(e):
 @app.errorhandler(500)
 def server_error(e):
     """Handle 500 errors."""
-    logger.error(f"Server error: {str(e)}")
+    logger.error("Server error: %s", e)
     return render_template('error.html', error="Server error. Please check the logs."), 500
 
+prewarm()
+if app.config['PRELOAD_APP'] and hasattr(os, 'register_at_fork'):
+    # gunicorn --preload forks workers from this process; elect among them, not here
+    os.register_at_fork(after_in_child=start_background_services)
+else:
+    start_background_services()
+
+BOOT_MS = round((time.perf_counter() - BOOT_STARTED) * 1000, 1)
+logger.info("App loaded in %sms (pid %s, scheduler leader: %s)", BOOT_MS, os.getpid(), leader_lock.is_leader,
+            extra={'operation': 'boot', 'duration_ms': BOOT_MS, 'preload': app.config['PRELOAD_APP']})
+
 if __name__ == '__main__':
     host = os.environ.get('HOST', '0.0.0.0')
     port = int(os.environ.get('PORT', 5000))
@@ -4,22 +4,27 @@ import asyncio
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
-from typing import List, Dict, Tuple, Optional, Union
+from typing import List, Dict, Tuple, Optional, Union, Callable
 import json
 from datetime import datetime
 import shutil
 
-# Configure logging
+from log_setup import log_operation
+from manifest import encode_manifest
+from scanner import scan_directory, ExclusionMatcher, DEFAULT_EXCLUSIONS
+
+# Handlers and level come from log_setup.setup_logging; records go through its queue
 logger = logging.getLogger('file_manager')
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.FileHandler('file_manager.log')
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
 
 # Optimize hash performance with larger chunk size
 HASH_CHUNK_SIZE = 262144  # 256KB
 
+# Folders under the upload root that make up the catalog
+CATALOG_FOLDERS = ['main', 'pack', 'custom']
+
+# Called as callback(done, total); may raise to abort the operation
+ProgressCallback = Callable[[int, int], None]
+
 def get_file_hash(file_path: str) -> str:
     """
     Calculate SHA256 hash of a file with optimal chunk size.
@@ -38,10 +43,10 @@ def get_file_hash(file_path: str) -> str:
                 sha256_hash.update(chunk)
         return sha256_hash.hexdigest()
     except IOError as e:
-        logger.error(f"Error reading file {file_path}: {str(e)}")
+        logger.error("Error reading file %s: %s", file_path, e)
         raise
     except Exception as e:
-        logger.error(f"Unexpected error hashing file {file_path}: {str(e)}")
+        logger.error("Unexpected error hashing file %s: %s", file_path, e)
         raise
 
 async def async_get_file_hash(file_path: str) -> str:
@@ -67,62 +72,64 @@ def create_directory_if_not_exists(directory_path: str) -> None:
     """
     try:
         os.makedirs(directory_path, exist_ok=True)
-        logger.debug(f"Directory created or verified: {directory_path}")
+        logger.debug("Directory created or verified: %s", directory_path)
     except OSError as e:
-        logger.error(f"Error creating directory {directory_path}: {str(e)}")
+        logger.error("Error creating directory %s: %s", directory_path, e)
         raise
 
-async def generate_filelist(target_folder: str, exclusions: Optional[List[str]] = None) -> List[str]:
+async def generate_filelist(target_folder: str, exclusions: Optional[List[str]] = None,
+                            progress_callback: Optional[ProgressCallback] = None) -> List[str]:
     """
     Generate a list of files with their hashes.
     
     Args:
         target_folder: Folder containing files to list
-        exclusions: List of file patterns to exclude
+        exclusions: gitignore-style patterns to exclude (see scanner.ExclusionMatcher)
+        progress_callback: Optional callback(done, total) invoked per hashed file
         
     Returns:
         List of strings in format: "path/to/file,hash"
     """
     if not os.path.exists(target_folder):
-        logger.error(f"Target folder does not exist: {target_folder}")
+        logger.error("Target folder does not exist: %s", target_folder)
         raise FileNotFoundError(f"Target folder does not exist: {target_folder}")
     
-    if exclusions is None:
-        exclusions = ['.git', '__pycache__', '.vscode', '.idea', '.DS_Store']
-    
     filelist = []
     tasks = []
     
-    # Use a thread pool for file operations
-    loop = asyncio.get_event_loop()
-    executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 2))
-    
-    for root, dirs, files in os.walk(target_folder):
-        # Skip excluded directories
-        dirs[:] = [d for d in dirs if d not in exclusions]
-        
-        for file in files:
-            # Skip excluded files
-            if any(excl in file for excl in exclusions):
-                continue
-            
-            filepath = os.path.join(root, file)
-            relative_path = os.path.relpath(filepath, target_folder)
-            
+    with log_operation(logger, 'generate_filelist', folder=target_folder) as op:
+        # Enumerate off the event loop; the scanner parallelizes across subtrees
+        loop = asyncio.get_event_loop()
+        entries = await loop.run_in_executor(None, scan_directory, target_folder, exclusions)
+        
+        # Use a thread pool for file operations
+        executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 2))
+        
+        for entry in entries:
             # Schedule hashing task
-            task = loop.run_in_executor(executor, get_file_hash, filepath)
-            tasks.append((relative_path, task))
-    
-    # Wait for all hashing tasks to complete
-    for relative_path, task in tasks:
+            task = loop.run_in_executor(executor, get_file_hash, entry.path)
+            tasks.append((entry, task))
+        
+        # Wait for all hashing tasks to complete
         try:
-            file_hash = await task
-            filelist.append(f"{relative_path},{file_hash}")
-            logger.debug(f"Processed file: {relative_path}")
-        except Exception as e:
-            logger.error(f"Error processing {relative_path}: {str(e)}")
+            for done, (entry, task) in enumerate(tasks, 1):
+                try:
+                    file_hash = await task
+                    filelist.append(f"{entry.relative_path},{file_hash}")
+                    op.add(files=1, bytes=entry.size)
+                    logger.debug("Processed file: %s", entry.relative_path, extra={'sample': True})
+                except Exception as e:
+                    op.add(errors=1)
+                    logger.error("Error processing %s: %s", entry.relative_path, e)
+                
+                if progress_callback:
+                    progress_callback(done, len(tasks))
+        finally:
+            # Drop pending hashes if the callback aborted the run
+            for _, task in tasks:
+                task.cancel()
+            executor.shutdown(wait=False)
     
-    logger.info(f"Generated filelist with {len(filelist)} entries")
     return filelist
 
 async def save_filelist(filelist: List[str], output_file: str) -> bool:
@@ -151,13 +158,13 @@ async def save_filelist(filelist: List[str], output_file: str) -> bool:
         # Atomically replace the file
         shutil.move(temp_file, output_file)
         
-        logger.info(f"File list saved to {output_file}")
+        logger.info("File list saved to %s", output_file)
         return True
     except IOError as e:
-        logger.error(f"Error saving file list to {output_file}: {str(e)}")
+        logger.error("Error saving file list to %s: %s", output_file, e)
         return False
     except Exception as e:
-        logger.error(f"Unexpected error saving file list: {str(e)}")
+        logger.error("Unexpected error saving file list: %s", e)
         return False
 
 def load_file_status(status_file: str) -> Dict:
@@ -176,10 +183,10 @@ def load_file_status(status_file: str) -> Dict:
                 return json.load(f)
         return {}
     except json.JSONDecodeError as e:
-        logger.error(f"Error parsing file status JSON: {str(e)}")
+        logger.error("Error parsing file status JSON: %s", e)
         return {}
     except Exception as e:
-        logger.error(f"Error loading file status: {str(e)}")
+        logger.error("Error loading file status: %s", e)
         return {}
 
 def save_file_status(file_status: Dict, status_file: str) -> bool:
@@ -202,10 +209,10 @@ def save_file_status(file_status: Dict, status_file: str) -> bool:
         # Atomically replace the file
         shutil.move(temp_file, status_file)
         
-        logger.info(f"File status saved to {status_file}")
+        logger.info("File status saved to %s", status_file)
         return True
     except Exception as e:
-        logger.error(f"Error saving file status: {str(e)}")
+        logger.error("Error saving file status: %s", e)
         return False
 
 def update_file_status(filename: str, folder: str, filepath: str, status: str, status_file: str) -> Dict:
@@ -236,32 +243,52 @@ def update_file_status(filename: str, folder: str, filepath: str, status: str, s
         save_file_status(file_status, status_file)
         return file_status
     except Exception as e:
-        logger.error(f"Error updating file status: {str(e)}")
+        logger.error("Error updating file status: %s", e)
         raise
 
-def generate_patchlist_from_status(file_status: Dict, output_file: str) -> bool:
+def generate_patchlist_from_status(file_status: Dict, output_file: str,
+                                   manifest_file: Optional[str] = None) -> bool:
     """
     Generate patchlist file from file status dictionary.
     
     Args:
         file_status: Dictionary of file statuses
         output_file: Path to output file
+        manifest_file: Optional path to also write the binary manifest to
         
     Returns:
         True if successful, False otherwise
     """
+    outputs: List[Tuple[str, str]] = []
     try:
-        with open(output_file, 'w') as f:
-            for filename, details in file_status.items():
-                # Only include files with 'ON' status
-                if details.get('status') == 'ON':
-                    filepath = f"{details['folder']}/{filename}" if details['folder'] != 'main' else filename
-                    f.write(f"{filepath},{details['sha256']}\n")
-        
-        logger.info(f"Generated patchlist with {sum(1 for d in file_status.values() if d.get('status') == 'ON')} files")
+        entries = []
+        for filename, details in file_status.items():
+            # Only include files with 'ON' status
+            if details.get('status') == 'ON':
+                filepath = f"{details['folder']}/{filename}" if details['folder'] != 'main' else filename
+                entries.append((filepath, details['sha256'], details.get('size', 0)))
+        
+        # Build every output in a temporary file first; nothing is replaced
+        # unless all of them could be built, so the list and manifest stay in sync
+        outputs = [(f"{output_file}.tmp", output_file)]
+        with open(outputs[0][0], 'w') as f:
+            for filepath, sha256, _ in entries:
+                f.write(f"{filepath},{sha256}\n")
+        if manifest_file:
+            outputs.append((f"{manifest_file}.tmp", manifest_file))
+            with open(outputs[1][0], 'wb') as f:
+                f.write(encode_manifest(entries))
+        
+        for temp_file, target in outputs:
+            shutil.move(temp_file, target)
+        
+        logger.info("Generated patchlist with %s files", len(entries))
         return True
     except Exception as e:
-        logger.error(f"Error generating patchlist: {str(e)}")
+        for temp_file, _ in outputs:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        logger.error("Error generating patchlist: %s", e)
         return False
 
 def delete_file(filename: str, file_status: Dict, upload_folder: str, status_file: str) -> Tuple[bool, Dict]:
@@ -279,7 +306,7 @@ def delete_file(filename: str, file_status: Dict, upload_folder: str, status_fil
     """
     try:
         if filename not in file_status:
-            logger.warning(f"File not found in status: {filename}")
+            logger.warning("File not found in status: %s", filename)
             return False, file_status
         
         folder = file_status[filename]['folder']
@@ -288,7 +315,7 @@ def delete_file(filename: str, file_status: Dict, upload_folder: str, status_fil
         # Remove the file if it exists
         if os.path.exists(filepath):
             os.remove(filepath)
-            logger.info(f"Deleted file: {filepath}")
+            logger.info("Deleted file: %s", filepath)
         
         # Update the status dictionary
         del file_status[filename]
@@ -296,5 +323,153 @@ def delete_file(filename: str, file_status: Dict, upload_folder: str, status_fil
         
         return True, file_status
     except Exception as e:
-        logger.error(f"Error deleting file {filename}: {str(e)}")
-        return False, file_status
\ No newline at end of file
+        logger.error("Error deleting file %s: %s", filename, e)
+        return False, file_status
+
+def finalize_uploads(entries: List[Dict], status: str, status_file: str,
+                     progress_callback: Optional[ProgressCallback] = None) -> Dict:
+    """
+    Hash a batch of uploaded files and record them in the file status.
+    
+    Hashing happens before the status file is loaded so that edits made
+    while a large batch is processing are not overwritten.
+    
+    Args:
+        entries: List of dicts with 'filename', 'folder' and 'filepath' keys
+        status: Status flag for the new entries ('ON' or 'OFF')
+        status_file: Path to status JSON file
+        progress_callback: Optional callback(done, total) invoked per file
+        
+    Returns:
+        Updated file status dictionary
+    """
+    updates = {}
+    with log_operation(logger, 'finalize_uploads') as op:
+        for done, entry in enumerate(entries, 1):
+            filepath = entry['filepath']
+            try:
+                updates[entry['filename']] = {
+                    'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'size': os.path.getsize(filepath),
+                    'sha256': get_file_hash(filepath),
+                    'status': status,
+                    'folder': entry['folder']
+                }
+                op.add(files=1, bytes=updates[entry['filename']]['size'])
+            except OSError as e:
+                op.add(errors=1)
+                logger.error("Error finalizing upload %s: %s", filepath, e)
+            
+            if progress_callback:
+                progress_callback(done, len(entries))
+        
+        file_status = load_file_status(status_file)
+        file_status.update(updates)
+        save_file_status(file_status, status_file)
+    
+    return file_status
+
+def rescan_file_status(upload_folder: str, status_file: str,
+                       progress_callback: Optional[ProgressCallback] = None) -> Dict:
+    """
+    Re-hash every file in the catalog folders and refresh the file status.
+    
+    Known files keep their status; files found on disk without an entry are
+    added as 'ON'. Entries whose file is missing are left untouched. Files
+    matching scanner.DEFAULT_EXCLUSIONS (OS metadata, temp files) are
+    skipped, and entries for them added by earlier rescans are dropped.
+    
+    Args:
+        upload_folder: Base upload folder
+        status_file: Path to status JSON file
+        progress_callback: Optional callback(done, total) invoked per file
+        
+    Returns:
+        Updated file status dictionary
+    """
+    # Catalog entries are keyed by bare file name, so only the top level of each folder counts
+    found = []
+    for folder in CATALOG_FOLDERS:
+        folder_path = os.path.join(upload_folder, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for entry in scan_directory(folder_path, DEFAULT_EXCLUSIONS, recursive=False):
+            found.append((entry.relative_path, folder, entry.path))
+    
+    updates = {}
+    with log_operation(logger, 'rescan', folder=upload_folder) as op:
+        for done, (filename, folder, filepath) in enumerate(found, 1):
+            try:
+                updates[filename] = {
+                    'size': os.path.getsize(filepath),
+                    'sha256': get_file_hash(filepath),
+                    'folder': folder
+                }
+                op.add(files=1, bytes=updates[filename]['size'])
+            except OSError as e:
+                op.add(errors=1)
+                logger.error("Error rescanning %s: %s", filepath, e)
+            
+            if progress_callback:
+                progress_callback(done, len(found))
+        
+        file_status = load_file_status(status_file)
+        matcher = ExclusionMatcher(DEFAULT_EXCLUSIONS)
+        for filename in [name for name in file_status if matcher.is_excluded(name)]:
+            del file_status[filename]
+            op.add(removed=1)
+        
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for filename, update in updates.items():
+            if filename in file_status:
+                if file_status[filename].get('sha256') != update['sha256']:
+                    update['date'] = now
+                    op.add(changed=1)
+                file_status[filename].update(update)
+            else:
+                file_status[filename] = dict(update, date=now, status='ON')
+                op.add(added=1)
+        save_file_status(file_status, status_file)
+    
+    return file_status
+
+def verify_file_status(file_status: Dict, upload_folder: str,
+                       progress_callback: Optional[ProgressCallback] = None,
+                       object_path: Optional[Callable[[str], str]] = None) -> List[Dict]:
+    """
+    Check that files on disk still match their recorded SHA256.
+    
+    Args:
+        file_status: Dictionary of file statuses
+        upload_folder: Base upload folder
+        progress_callback: Optional callback(done, total) invoked per file
+        object_path: Optional callback mapping a SHA256 to the stored copy
+            to check instead of the file in the upload folder
+        
+    Returns:
+        List of mismatches as dicts with 'filename', 'expected' and 'actual'
+        ('actual' is None when the file is missing)
+    """
+    mismatches = []
+    items = list(file_status.items())
+    with log_operation(logger, 'verify', folder=upload_folder) as op:
+        for done, (filename, details) in enumerate(items, 1):
+            if object_path:
+                filepath = object_path(details.get('sha256'))
+            else:
+                filepath = os.path.join(upload_folder, details['folder'], filename)
+            try:
+                actual = get_file_hash(filepath)
+                op.add(files=1, bytes=details.get('size', 0))
+            except OSError:
+                actual = None
+            
+            if actual != details.get('sha256'):
+                mismatches.append({'filename': filename, 'expected': details.get('sha256'), 'actual': actual})
+                op.add(mismatches=1)
+                logger.warning("Integrity mismatch for %s", filepath)
+            
+            if progress_callback:
+                progress_callback(done, len(items))
+    
+    return mismatches
\ No newline at end of file
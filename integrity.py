@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import shutil
+
+from file_manager import HASH_CHUNK_SIZE, load_file_status
+from releases import ReleaseStore
+
+logger = logging.getLogger('integrity')
+
+# What to do with entries whose file no longer matches the recorded hash
+ACTION_FLAG = 'flag'
+ACTION_DISABLE = 'disable'
+
+# Where a checked file comes from
+SOURCE_RELEASE = 'release'  # stored copy served to clients
+SOURCE_DRAFT = 'draft'      # file in the upload folder
+
+
+class IOThrottle:
+    """
+    Limit read throughput to a bytes/sec budget by sleeping between chunks.
+
+    A single throttle is shared across all files hashed in one verification
+    slice so the budget applies to the slice as a whole.
+    """
+
+    def __init__(self, bytes_per_sec: int):
+        self.bytes_per_sec = bytes_per_sec
+        self.started = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, nbytes: int) -> None:
+        """Account for nbytes read and sleep if ahead of the budget."""
+        self.consumed += nbytes
+        if self.bytes_per_sec <= 0:
+            return
+        ahead = self.consumed / self.bytes_per_sec - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def get_file_hash_throttled(file_path: str, throttle: IOThrottle) -> str:
+    """
+    Calculate SHA256 hash of a file without exceeding the throttle budget.
+
+    Args:
+        file_path: Path to the file to hash
+        throttle: Shared IOThrottle
+
+    Returns:
+        SHA256 hash as a hexadecimal string
+    """
+    sha256_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256_hash.update(chunk)
+            throttle.consume(len(chunk))
+    return sha256_hash.hexdigest()
+
+def load_verification_state(state_file: str) -> Dict:
+    """
+    Load the verifier cursor and findings.
+
+    Args:
+        state_file: Path to verifier state JSON file
+
+    Returns:
+        State dictionary
+    """
+    state = {'cursor': None, 'pass_started': None, 'last_pass_completed': None, 'mismatches': {}}
+    try:
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                state.update(json.load(f))
+    except (json.JSONDecodeError, OSError) as e:
+        logger.error("Error loading verification state: %s", e)
+    return state
+
+def save_verification_state(state: Dict, state_file: str) -> None:
+    """
+    Save the verifier cursor and findings.
+
+    Args:
+        state: State dictionary
+        state_file: Path to verifier state JSON file
+    """
+    temp_file = f"{state_file}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(state, f, indent=2)
+    shutil.move(temp_file, state_file)
+
+def run_verification_slice(status_file: str, upload_folder: str, state_file: str,
+                           bytes_per_sec: int, time_budget: float, action: str = ACTION_FLAG,
+                           on_disable: Optional[Callable[[List[str]], None]] = None,
+                           release_store: Optional[ReleaseStore] = None) -> Dict:
+    """
+    Re-hash catalog files for up to time_budget seconds, continuing from
+    where the previous slice stopped.
+
+    A pass covers two sets of files: the stored copies of the served
+    release, which is what clients download, and the draft files in the
+    upload folder. Only mismatches in the served release are acted on;
+    draft mismatches are recorded for the next publish to deal with.
+
+    Files are visited in key order and the cursor is persisted after every
+    file, so a restart resumes mid-pass. A file that has started hashing is
+    always finished, so a slice may overrun its budget by one file.
+
+    Args:
+        status_file: Path to status JSON file (the draft catalog)
+        upload_folder: Base upload folder
+        state_file: Path to verifier state JSON file
+        bytes_per_sec: Read budget (0 for unlimited)
+        time_budget: Seconds to spend in this slice
+        action: ACTION_FLAG to only record mismatches, ACTION_DISABLE to also
+            drop corrupted files from the served release
+        on_disable: Called with the names of served entries whose stored
+            copy is corrupted, e.g. to publish a release without them
+        release_store: Store of the served release; without it only the
+            draft is checked
+
+    Returns:
+        Summary dict with 'checked', 'bytes', 'mismatches' and 'pass_completed'
+    """
+    state = load_verification_state(state_file)
+    targets = _verification_targets(status_file, upload_folder, release_store)
+    keys = sorted(targets)
+
+    # Cursors from before keys carried their source can't be placed in the new order
+    if state['cursor'] is not None and ':' not in state['cursor']:
+        state['cursor'] = None
+    if state['cursor'] is None:
+        state['pass_started'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    pending = [k for k in keys if state['cursor'] is None or k > state['cursor']]
+
+    throttle = IOThrottle(bytes_per_sec)
+    deadline = time.monotonic() + time_budget
+    checked = 0
+    found = []
+
+    for key in pending:
+        if time.monotonic() >= deadline:
+            break
+
+        source, filename = key.split(':', 1)
+        filepath, expected = targets[key]
+        try:
+            actual = get_file_hash_throttled(filepath, throttle)
+        except OSError:
+            actual = None
+        checked += 1
+
+        if actual == expected:
+            state['mismatches'].pop(key, None)
+        elif _confirm_mismatch(source, filename, expected, status_file, release_store):
+            state['mismatches'][key] = {
+                'filename': filename,
+                'source': source,
+                'expected': expected,
+                'actual': actual,
+                'detected': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+            found.append(key)
+            logger.warning("Integrity mismatch for %s (%s)", filepath, source)
+
+        state['cursor'] = key
+        save_verification_state(state, state_file)
+
+    pass_completed = not pending or state['cursor'] == pending[-1]
+    if pass_completed:
+        state['cursor'] = None
+        state['last_pass_completed'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Forget findings for files no longer in the draft or the served release
+        state['mismatches'] = {k: m for k, m in state['mismatches'].items() if k in targets}
+        save_verification_state(state, state_file)
+
+    served = [key.split(':', 1)[1] for key in found if key.startswith(SOURCE_RELEASE + ':')]
+    if served and action == ACTION_DISABLE and release_store is not None:
+        _disable_served(served, release_store, on_disable)
+
+    logger.info(
+        "Integrity slice checked %s files (%s bytes), %s new mismatches%s",
+        checked, throttle.consumed, len(found), ', pass completed' if pass_completed else '',
+        extra={'operation': 'verify_slice', 'files': checked, 'bytes': throttle.consumed,
+               'mismatches': len(found), 'pass_completed': pass_completed}
+    )
+    return {
+        'checked': checked,
+        'bytes': throttle.consumed,
+        'mismatches': found,
+        'pass_completed': pass_completed
+    }
+
+def _verification_targets(status_file: str, upload_folder: str,
+                          release_store: Optional[ReleaseStore]) -> Dict[str, Tuple[str, str]]:
+    """Map '<source>:<filename>' keys to (path to hash, expected SHA256)."""
+    targets = {}
+    for filename, details in load_file_status(status_file).items():
+        targets[f"{SOURCE_DRAFT}:{filename}"] = (
+            os.path.join(upload_folder, details['folder'], filename), details.get('sha256')
+        )
+    if release_store is not None:
+        for filename, details in release_store.current_status().items():
+            if details.get('status') == 'ON':
+                targets[f"{SOURCE_RELEASE}:{filename}"] = (
+                    release_store.object_path(details['sha256']), details['sha256']
+                )
+    return targets
+
+def _confirm_mismatch(source: str, filename: str, expected: str, status_file: str,
+                      release_store: Optional[ReleaseStore]) -> bool:
+    """Ignore mismatches caused by the entry being replaced or republished while hashing."""
+    if source == SOURCE_RELEASE:
+        current = release_store.current_status().get(filename) if release_store else None
+    else:
+        current = load_file_status(status_file).get(filename)
+    return current is not None and current.get('sha256') == expected
+
+def _disable_served(filenames: List[str], release_store: ReleaseStore,
+                    on_disable: Optional[Callable[[List[str]], None]]) -> None:
+    """
+    Drop corrupted stored copies and notify the caller.
+
+    The copies are deleted so that the next publish stores the file again
+    from the upload folder instead of reusing the corrupted object.
+    """
+    file_status = release_store.current_status()
+    for filename in filenames:
+        path = release_store.object_path(file_status[filename]['sha256'])
+        if os.path.exists(path):
+            os.remove(path)
+    logger.warning("Removed %s corrupted files from the served release: %s", len(filenames), ', '.join(filenames))
+
+    if on_disable:
+        on_disable(filenames)
@@ -0,0 +1,367 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+import psutil
+
+logger = logging.getLogger('job_queue')
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+ACTIVE_STATES = {JOB_QUEUED, JOB_RUNNING}
+FINISHED_STATES = {JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED}
+
+# Persist progress at most this often so tight loops don't rewrite the job table
+PROGRESS_PERSIST_INTERVAL = 0.5  # seconds
+# Re-read the job table for cross-process cancel requests at most this often
+CANCEL_POLL_INTERVAL = 1.0  # seconds
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when cancellation has been requested."""
+
+
+class JobContext:
+    """
+    Handle passed to a running job function for progress reporting and
+    cooperative cancellation.
+    """
+
+    def __init__(self, manager: 'JobManager', job_id: str):
+        self.manager = manager
+        self.job_id = job_id
+        self._last_persist = 0.0
+        self._last_cancel_poll = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        """True if cancellation was requested from this or another process."""
+        if self.manager._cancel_event(self.job_id).is_set():
+            return True
+
+        now = time.monotonic()
+        if now - self._last_cancel_poll >= CANCEL_POLL_INTERVAL:
+            self._last_cancel_poll = now
+            job = self.manager.get(self.job_id)
+            if job and job.get('cancel_requested'):
+                self.manager._cancel_event(self.job_id).set()
+                return True
+        return False
+
+    def check_cancelled(self) -> None:
+        """Raise JobCancelled if the job should stop."""
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def update(self, progress: float, message: Optional[str] = None) -> None:
+        """
+        Report progress and check for cancellation.
+
+        Args:
+            progress: Completion percentage (0-100)
+            message: Optional human readable status line
+        """
+        self.check_cancelled()
+
+        now = time.monotonic()
+        if now - self._last_persist < PROGRESS_PERSIST_INTERVAL and progress < 100:
+            return
+        self._last_persist = now
+
+        changes = {'progress': round(max(0.0, min(100.0, progress)), 1)}
+        if message is not None:
+            changes['message'] = message
+        self.manager._update_job(self.job_id, **changes)
+
+    def step(self, done: int, total: int, message: Optional[str] = None) -> None:
+        """
+        Report progress as a done/total count. Usable directly as the
+        progress_callback of the file_manager functions.
+        """
+        self.update(done * 100.0 / total if total else 100.0, message)
+
+
+class JobManager:
+    """
+    In-process worker pool backed by a persistent JSON job table.
+
+    Job functions are registered by type and called as func(ctx, **params).
+    Their return value must be JSON serializable and is stored as the job
+    result. The job table is shared on disk so any worker process can answer
+    status queries and record cancel requests for jobs run elsewhere.
+    """
+
+    def __init__(self, jobs_file: str, max_workers: int = 2, history_limit: int = 200):
+        self.jobs_file = jobs_file
+        self.history_limit = history_limit
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._unique: Dict[str, bool] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._futures: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._recover_interrupted()
+
+    # -- registration and submission -------------------------------------
+
+    def register(self, job_type: str, func: Callable[..., Any], unique: bool = False) -> None:
+        """
+        Register a job function.
+
+        Args:
+            job_type: Name used when submitting
+            func: Callable taking (ctx, **params)
+            unique: If True, submitting while a job of this type is active
+                returns the active job instead of queueing another
+        """
+        self._handlers[job_type] = func
+        self._unique[job_type] = unique
+
+    def submit(self, job_type: str, **params: Any) -> Dict:
+        """
+        Queue a job for background execution.
+
+        Args:
+            job_type: Registered job type
+            **params: JSON serializable keyword arguments for the job function
+
+        Returns:
+            The job record
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        with self._locked_table() as jobs:
+            if self._unique[job_type]:
+                for job in jobs.values():
+                    if job['type'] == job_type and job['status'] in ACTIVE_STATES:
+                        # The owner may have been recycled since this manager started
+                        if _expire_if_orphaned(job):
+                            continue
+                        logger.info("Reusing active %s job %s", job_type, job['id'])
+                        return dict(job)
+
+            now = _timestamp()
+            job = {
+                'id': uuid.uuid4().hex,
+                'type': job_type,
+                'params': params,
+                'status': JOB_QUEUED,
+                'progress': 0.0,
+                'message': '',
+                'result': None,
+                'error': None,
+                'cancel_requested': False,
+                'owner_pid': os.getpid(),
+                'owner_started': _process_started(),
+                'created': now,
+                'updated': now,
+            }
+            jobs[job['id']] = job
+            self._prune(jobs)
+
+        self._events[job['id']] = threading.Event()
+        self._futures[job['id']] = self._executor.submit(self._run, job['id'])
+        logger.info("Queued %s job %s", job_type, job['id'])
+        return dict(job)
+
+    # -- queries ---------------------------------------------------------
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return the job record or None."""
+        return self._load_jobs().get(job_id)
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        """Return the most recent jobs, newest first."""
+        jobs = sorted(self._load_jobs().values(), key=lambda j: j['created'], reverse=True)
+        return jobs[:limit]
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        Request cancellation of a job.
+
+        Queued jobs owned by this process are cancelled immediately; running
+        jobs stop at their next progress report.
+
+        Returns:
+            The updated job record, or None if the job does not exist
+        """
+        with self._locked_table() as jobs:
+            job = jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in FINISHED_STATES:
+                return dict(job)
+
+            job['cancel_requested'] = True
+            job['updated'] = _timestamp()
+
+            future = self._futures.get(job_id)
+            if job['status'] == JOB_QUEUED and future is not None and future.cancel():
+                job['status'] = JOB_CANCELLED
+                job['message'] = 'Cancelled before start'
+
+        if job_id in self._events:
+            self._events[job_id].set()
+        logger.info("Cancel requested for job %s", job_id)
+        return dict(job)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop accepting work and optionally wait for running jobs."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    # -- execution -------------------------------------------------------
+
+    def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None:
+            return
+        if job.get('cancel_requested'):
+            self._update_job(job_id, status=JOB_CANCELLED, message='Cancelled before start')
+            return
+
+        self._update_job(job_id, status=JOB_RUNNING, message='Running')
+        ctx = JobContext(self, job_id)
+        started = time.monotonic()
+
+        try:
+            result = self._handlers[job['type']](ctx, **job['params'])
+        except JobCancelled:
+            self._update_job(job_id, status=JOB_CANCELLED, message='Cancelled')
+            logger.info("Job %s cancelled", job_id)
+        except Exception as e:
+            self._update_job(job_id, status=JOB_FAILED, error=str(e), message='Failed')
+            logger.error("Job %s (%s) failed: %s", job_id, job['type'], e)
+        else:
+            self._update_job(job_id, status=JOB_COMPLETED, progress=100.0,
+                             result=result, message='Completed')
+            logger.info("Job %s (%s) completed in %.2fs", job_id, job['type'], time.monotonic() - started)
+        finally:
+            self._events.pop(job_id, None)
+            self._futures.pop(job_id, None)
+
+    def _cancel_event(self, job_id: str) -> threading.Event:
+        return self._events.setdefault(job_id, threading.Event())
+
+    def _update_job(self, job_id: str, **changes: Any) -> None:
+        with self._locked_table() as jobs:
+            job = jobs.get(job_id)
+            if job is None:
+                return
+            job.update(changes)
+            job['updated'] = _timestamp()
+
+    def _recover_interrupted(self) -> None:
+        """Mark active jobs whose owning process is gone as failed."""
+        with self._locked_table() as jobs:
+            for job in jobs.values():
+                if job['status'] in ACTIVE_STATES:
+                    _expire_if_orphaned(job)
+
+    def _prune(self, jobs: Dict[str, Dict]) -> None:
+        finished = [j for j in jobs.values() if j['status'] in FINISHED_STATES]
+        excess = len(finished) - self.history_limit
+        if excess > 0:
+            for job in sorted(finished, key=lambda j: j['updated'])[:excess]:
+                del jobs[job['id']]
+
+    # -- persistence -----------------------------------------------------
+
+    def _load_jobs(self) -> Dict[str, Dict]:
+        try:
+            if os.path.exists(self.jobs_file):
+                with open(self.jobs_file, 'r') as f:
+                    return json.load(f)
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error("Error loading job table: %s", e)
+            return {}
+
+    def _save_jobs(self, jobs: Dict[str, Dict]) -> None:
+        temp_file = f"{self.jobs_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(jobs, f, indent=2)
+        shutil.move(temp_file, self.jobs_file)
+
+    def _locked_table(self) -> '_JobTableLock':
+        return _JobTableLock(self)
+
+
+class _JobTableLock:
+    """Context manager yielding the job table under thread and file locks."""
+
+    def __init__(self, manager: JobManager):
+        self.manager = manager
+        self.jobs: Dict[str, Dict] = {}
+        self._lock_file = None
+
+    def __enter__(self) -> Dict[str, Dict]:
+        self.manager._lock.acquire()
+        if fcntl is not None:
+            self._lock_file = open(f"{self.manager.jobs_file}.lock", 'w')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self.jobs = self.manager._load_jobs()
+        return self.jobs
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self.manager._save_jobs(self.jobs)
+        finally:
+            if self._lock_file is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                self._lock_file.close()
+            self.manager._lock.release()
+
+
+def _process_started(pid: Optional[int] = None) -> Optional[float]:
+    """Return the start time of a process, or None if it doesn't exist."""
+    try:
+        return psutil.Process(pid).create_time()
+    except (psutil.Error, ValueError):
+        return None
+
+def _owner_alive(job: Dict) -> bool:
+    """
+    Check whether the process that queued a job is still running.
+
+    PIDs are reused after restarts, so the owner is identified by its PID
+    together with its start time.
+    """
+    pid = job.get('owner_pid')
+    if not isinstance(pid, int):
+        return False
+    started = _process_started(pid)
+    if 'owner_started' not in job:  # recorded before start times were stored
+        return started is not None
+    return started is not None and started == job['owner_started']
+
+def _expire_if_orphaned(job: Dict) -> bool:
+    """Mark an active job as failed if its owner is gone. Caller holds the table lock."""
+    if _owner_alive(job):
+        return False
+    job['status'] = JOB_FAILED
+    job['error'] = 'Interrupted by server restart'
+    job['updated'] = _timestamp()
+    logger.warning("Job %s was interrupted by a restart", job['id'])
+    return True
+
+def _timestamp() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
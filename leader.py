@@ -0,0 +1,61 @@
+import os
+import logging
+from typing import Optional, TextIO
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process considers itself leader
+    fcntl = None
+
+logger = logging.getLogger('leader')
+
+
+class LeaderLock:
+    """
+    Non-blocking exclusive file lock electing one process as leader.
+
+    The lock is held for the life of the process and released by the OS
+    when it exits, so a surviving process can take over on its next
+    try_acquire(). Acquire it only after forking: flock locks are shared
+    with child processes.
+    """
+
+    def __init__(self, lock_file: str):
+        self.lock_file = lock_file
+        self._handle: Optional[TextIO] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        # A forked child inherits the handle but not the leadership
+        return self._handle is not None and self._pid == os.getpid()
+
+    def try_acquire(self) -> bool:
+        """
+        Try to become leader without blocking.
+
+        Returns:
+            True if this process holds the lock
+        """
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            self._handle = open(os.devnull, 'w')
+            self._pid = os.getpid()
+            return True
+
+        handle = open(self.lock_file, 'a+')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._handle = handle
+        self._pid = os.getpid()
+        logger.info("Process %s acquired leader lock %s", os.getpid(), self.lock_file)
+        return True
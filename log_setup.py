@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import itertools
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and
+# is emitted as a structured field.
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Per-item events marked with extra={'sample': True} are kept 1 in N
+DEFAULT_SAMPLE_RATE = 100
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'time': datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != 'sample':
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in `rate` records marked with extra={'sample': True}; pass all others."""
+
+    def __init__(self, rate: int = DEFAULT_SAMPLE_RATE):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'sample', False):
+            return True
+        return next(self._counter) % self.rate == 0
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() renders the message in the calling thread; records
+    stay in-process here, so they can be queued as-is and the message is
+    only built once the listener writes it out.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(log_file: str, level: int = logging.INFO, json_format: bool = True,
+                  sample_rate: int = DEFAULT_SAMPLE_RATE,
+                  extra_files: Optional[Dict[str, str]] = None) -> None:
+    """
+    Route all logging through a queue to a background writer thread.
+
+    Callers only pay for creating the record and putting it on the queue;
+    formatting and file I/O happen on the listener thread. Safe to call more
+    than once; later calls are ignored. If the process forks (gunicorn
+    --preload), the listener is restarted in the child.
+
+    Args:
+        log_file: Main log file receiving every record
+        level: Root log level
+        json_format: Write JSON lines instead of plain text
+        sample_rate: Keep 1 in N records marked with extra={'sample': True}
+        extra_files: Optional {logger name: file} for additional per-component logs
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return
+
+        if json_format:
+            formatter: logging.Formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+
+        handlers: List[logging.Handler] = []
+        main_handler = logging.FileHandler(log_file)
+        main_handler.setFormatter(formatter)
+        handlers.append(main_handler)
+
+        for name, path in (extra_files or {}).items():
+            handler = logging.FileHandler(path)
+            handler.setFormatter(formatter)
+            handler.addFilter(logging.Filter(name))
+            handlers.append(handler)
+
+        log_queue: queue.Queue = queue.Queue(-1)
+        queue_handler = _DeferredQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _queue_handler = queue_handler
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_after_fork)
+
+def _restart_after_fork() -> None:
+    """Give a forked child its own queue and writer thread; threads don't survive fork."""
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is None or _queue_handler is None:
+        return
+    log_queue: queue.Queue = queue.Queue(-1)
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class OperationSummary:
+    """
+    Context manager emitting one summary record for a batch operation.
+
+    Use it (via log_operation) in place of per-item INFO lines:
+
+        with log_operation(logger, 'rescan', folder=path) as op:
+            for item in items:
+                ...
+                op.add(files=1, bytes=size)
+
+    On exit a single record is logged with the counters, the duration and,
+    if the block raised, the error.
+    """
+
+    def __init__(self, logger: logging.Logger, operation: str, level: int = logging.INFO, **fields: Any):
+        self.logger = logger
+        self.operation = operation
+        self.level = level
+        self.fields = fields
+        self.counters: Dict[str, float] = {}
+        self.started = 0.0
+
+    def add(self, **counts: float) -> None:
+        """Increment named counters."""
+        for key, value in counts.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self) -> 'OperationSummary':
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        duration = time.monotonic() - self.started
+        summary = dict(self.fields, **self.counters)
+        summary['operation'] = self.operation
+        summary['duration_ms'] = round(duration * 1000, 1)
+        if exc_type is not None:
+            summary['error'] = str(exc)
+
+        details = ', '.join(f"{key}=%({key})s" for key in sorted(self.counters))
+        self.logger.log(
+            logging.ERROR if exc_type is not None else self.level,
+            f"%(operation)s finished in %(duration_ms)sms{': ' + details if details else ''}",
+            summary,
+            extra={k: v for k, v in summary.items() if k not in _RECORD_ATTRS}
+        )
+
+def log_operation(logger: logging.Logger, operation: str, level: int = logging.INFO,
+                  **fields: Any) -> OperationSummary:
+    """
+    Start a summary record for a batch operation (see OperationSummary).
+
+    Args:
+        logger: Logger to write the summary to
+        operation: Operation name
+        level: Level of the summary record on success
+        **fields: Constant fields to include, e.g. the target folder
+
+    Returns:
+        OperationSummary context manager
+    """
+    return OperationSummary(logger, operation, level, **fields)
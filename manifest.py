@@ -0,0 +1,149 @@
+"""
+Binary patchlist manifest.
+
+Layout (all integers little-endian):
+
+    header   magic b'PLMF', version u16, reserved u16, entry count u32,
+             string table size u32, total manifest size u64
+    entries  count x (path offset u32, path length u32, sha256 32 bytes,
+             file size u64), sorted by UTF-8 path bytes
+    strings  UTF-8 paths, concatenated
+
+Entries are fixed size and sorted, so a reader can look a path up with a
+binary search directly on the buffer without parsing the whole manifest.
+"""
+import os
+import struct
+import logging
+from typing import Iterable, Iterator, Optional, Tuple
+import shutil
+
+logger = logging.getLogger('manifest')
+
+MANIFEST_MAGIC = b'PLMF'
+MANIFEST_VERSION = 1
+MANIFEST_MIMETYPE = 'application/x-patchlist-manifest'
+
+HEADER = struct.Struct('<4sHHIIQ')
+ENTRY = struct.Struct('<II32sQ')
+
+
+class ManifestError(ValueError):
+    """Raised when a manifest buffer is malformed or of an unknown version."""
+
+
+def encode_manifest(entries: Iterable[Tuple[str, str, int]]) -> bytes:
+    """
+    Encode patchlist entries as a binary manifest.
+
+    Args:
+        entries: Iterable of (path, sha256 hex digest, file size)
+
+    Returns:
+        Manifest bytes
+    """
+    encoded = sorted((path.encode('utf-8'), bytes.fromhex(digest), size) for path, digest, size in entries)
+    for previous, current in zip(encoded, encoded[1:]):
+        if previous[0] == current[0]:
+            raise ManifestError(f"Duplicate path in manifest: {current[0].decode('utf-8')}")
+
+    strings = bytearray()
+    index = bytearray()
+    for path, digest, size in encoded:
+        if len(digest) != 32:
+            raise ManifestError(f"Invalid SHA256 digest for {path.decode('utf-8')}")
+        index += ENTRY.pack(len(strings), len(path), digest, size)
+        strings += path
+
+    total_size = HEADER.size + len(index) + len(strings)
+    header = HEADER.pack(MANIFEST_MAGIC, MANIFEST_VERSION, 0, len(encoded), len(strings), total_size)
+    return header + bytes(index) + bytes(strings)
+
+def write_manifest(entries: Iterable[Tuple[str, str, int]], output_file: str) -> None:
+    """
+    Write a binary manifest atomically.
+
+    Args:
+        entries: Iterable of (path, sha256 hex digest, file size)
+        output_file: Path to output file
+    """
+    data = encode_manifest(entries)
+    temp_file = f"{output_file}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+    shutil.move(temp_file, output_file)
+
+def read_manifest(manifest_file: str) -> 'Manifest':
+    """
+    Load a binary manifest from disk.
+
+    Args:
+        manifest_file: Path to manifest file
+
+    Returns:
+        Manifest instance
+    """
+    with open(manifest_file, 'rb') as f:
+        return Manifest(f.read())
+
+
+class Manifest:
+    """Read-only view over manifest bytes with O(log n) path lookup."""
+
+    def __init__(self, data: bytes):
+        if len(data) < HEADER.size:
+            raise ManifestError("Manifest is truncated")
+
+        magic, version, _, count, strings_size, total_size = HEADER.unpack_from(data, 0)
+        if magic != MANIFEST_MAGIC:
+            raise ManifestError("Not a patchlist manifest")
+        if version != MANIFEST_VERSION:
+            raise ManifestError(f"Unsupported manifest version: {version}")
+        if total_size != len(data) or total_size != HEADER.size + count * ENTRY.size + strings_size:
+            raise ManifestError("Manifest size does not match header")
+
+        self._data = memoryview(data)
+        self._count = count
+        self._strings_offset = HEADER.size + count * ENTRY.size
+        self.version = version
+        self.total_size = total_size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, i: int) -> Tuple[bytes, bytes, int]:
+        offset, length, digest, size = ENTRY.unpack_from(self._data, HEADER.size + i * ENTRY.size)
+        start = self._strings_offset + offset
+        return bytes(self._data[start:start + length]), digest, size
+
+    def __iter__(self) -> Iterator[Tuple[str, str, int]]:
+        """Yield (path, sha256 hex digest, file size) in path order."""
+        for i in range(self._count):
+            path, digest, size = self._entry(i)
+            yield path.decode('utf-8'), digest.hex(), size
+
+    def lookup(self, path: str) -> Optional[Tuple[str, int]]:
+        """
+        Find an entry by path.
+
+        Args:
+            path: '/'-separated path as listed in the patchlist
+
+        Returns:
+            (sha256 hex digest, file size), or None if the path is not listed
+        """
+        key = path.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry_path, digest, size = self._entry(mid)
+            if entry_path < key:
+                lo = mid + 1
+            elif entry_path > key:
+                hi = mid
+            else:
+                return digest.hex(), size
+        return None
+
+    def __contains__(self, path: str) -> bool:
+        return self.lookup(path) is not None
@@ -0,0 +1,306 @@
+import time
+import logging
+import threading
+from typing import Dict, Iterable, Iterator
+
+logger = logging.getLogger('rate_limit')
+
+# Admission modes
+MODE_REJECT = 'reject'  # answer immediately with Retry-After
+MODE_QUEUE = 'queue'    # wait up to the queue timeout, then answer with Retry-After
+
+# Forget idle clients after this long so the per-IP tables stay bounded
+CLIENT_IDLE_TIMEOUT = 600  # seconds
+CLEANUP_INTERVAL = 60  # seconds
+
+# Retry-After suggested when no concurrency slot frees up in time
+BUSY_RETRY_AFTER = 5  # seconds
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Holds up to `burst` tokens and refills at `rate` tokens per second.
+    A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, amount: float = 1.0) -> float:
+        """
+        Take tokens if available.
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they will be
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """Take tokens, sleeping until enough have accumulated (may go into debt for large amounts)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            deficit = -self.tokens
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
+
+
+class Rejection(Exception):
+    """Raised by AdmissionController.admit when a request is shed."""
+
+    def __init__(self, reason: str, retry_after: float, status_code: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class Ticket:
+    """A granted admission; release() frees its concurrency slots exactly once."""
+
+    def __init__(self, controller: 'AdmissionController', client: str):
+        self.controller = controller
+        self.client = client
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.controller._release(self.client)
+
+
+class _ClientState:
+    def __init__(self, rate: float, burst: float, bandwidth: float):
+        self.requests = TokenBucket(rate, burst)
+        self.bandwidth = TokenBucket(bandwidth, bandwidth)
+        self.active = 0
+        self.last_seen = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Per-client and global admission control for download routes.
+
+    Each client IP gets a request token bucket and a concurrency cap; a
+    global cap bounds concurrent downloads across all clients. Admitted
+    responses can be wrapped with throttle() so that their bytes draw on a
+    per-client and a shared global bandwidth bucket. Because each stream
+    asks for small chunks in turn, the global budget is shared roughly
+    evenly between active downloads rather than going to the fastest client.
+
+    All state is in-process: with several gunicorn workers, every worker
+    enforces the limits independently. Queueing and pacing block the
+    request's thread, so workers must be threaded (gthread) with more
+    threads than global_concurrency; a sync worker only ever sees one
+    active request. max_queue bounds how many requests may wait at once,
+    so waiters cannot take every thread; requests beyond it are shed
+    immediately.
+    """
+
+    def __init__(self, per_ip_rate: float = 5.0, per_ip_burst: float = 20.0,
+                 per_ip_concurrency: int = 4, global_concurrency: int = 24,
+                 mode: str = MODE_QUEUE, queue_timeout: float = 10.0,
+                 global_bandwidth: float = 0, per_ip_bandwidth: float = 0,
+                 max_queue: int = 6):
+        if mode not in (MODE_REJECT, MODE_QUEUE):
+            raise ValueError(f"Unknown admission mode: {mode}")
+
+        self.per_ip_rate = per_ip_rate
+        self.per_ip_burst = per_ip_burst
+        self.per_ip_concurrency = per_ip_concurrency
+        self.global_concurrency = global_concurrency
+        self.mode = mode
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.per_ip_bandwidth = per_ip_bandwidth
+        self.global_bandwidth = TokenBucket(global_bandwidth, global_bandwidth)
+
+        self._clients: Dict[str, _ClientState] = {}
+        self._active = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._last_cleanup = time.monotonic()
+        self._metrics = {
+            'admitted': 0,
+            'queued': 0,
+            'queue_wait_seconds': 0.0,
+            'shed': {'client_rate': 0, 'client_concurrency': 0, 'global_concurrency': 0,
+                     'queue_full': 0},
+            'bytes_sent': 0,
+            'peak_active': 0,
+        }
+
+    def admit(self, client: str) -> Ticket:
+        """
+        Admit a request from client or raise Rejection.
+
+        Args:
+            client: Client identifier, normally the remote IP
+
+        Returns:
+            Ticket that must be released when the response is finished
+        """
+        deadline = time.monotonic() + (self.queue_timeout if self.mode == MODE_QUEUE else 0)
+
+        with self._cond:
+            state = self._client(client)
+
+        # Request rate: wait for a token in queue mode if it arrives in time
+        wait = state.requests.try_consume()
+        if wait > 0:
+            if time.monotonic() + wait > deadline:
+                self._shed('client_rate')
+                raise Rejection('Too many requests from this client', wait, 429)
+            self._enter_queue()
+            try:
+                self._record_queue_wait(wait)
+                state.requests.consume(1.0)
+            finally:
+                self._leave_queue()
+
+        # Concurrency: wait on the condition until slots free up
+        with self._cond:
+            started = time.monotonic()
+            queued = False
+            try:
+                while True:
+                    if state.active >= self.per_ip_concurrency:
+                        reason, status_code = 'client_concurrency', 429
+                    elif self._active >= self.global_concurrency:
+                        reason, status_code = 'global_concurrency', 503
+                    else:
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics['shed'][reason] += 1
+                        message = ('Too many concurrent downloads from this client'
+                                   if status_code == 429 else 'Server is busy')
+                        raise Rejection(message, BUSY_RETRY_AFTER, status_code)
+                    if not queued:
+                        self._enter_queue_locked()
+                        queued = True
+                    self._cond.wait(remaining)
+            finally:
+                if queued:
+                    self._waiting -= 1
+
+            if queued:
+                self._metrics['queued'] += 1
+                self._metrics['queue_wait_seconds'] += time.monotonic() - started
+
+            state.active += 1
+            state.last_seen = time.monotonic()
+            self._active += 1
+            self._metrics['admitted'] += 1
+            self._metrics['peak_active'] = max(self._metrics['peak_active'], self._active)
+
+        return Ticket(self, client)
+
+    def throttle(self, chunks: Iterable[bytes], client: str) -> Iterator[bytes]:
+        """
+        Wrap a response body so it respects the bandwidth budgets.
+
+        Args:
+            chunks: Response body iterable
+            client: Client identifier used at admission
+
+        Returns:
+            Iterator yielding the same chunks, paced
+        """
+        with self._cond:
+            state = self._client(client)
+        try:
+            for chunk in chunks:
+                state.bandwidth.consume(len(chunk))
+                self.global_bandwidth.consume(len(chunk))
+                with self._cond:
+                    self._metrics['bytes_sent'] += len(chunk)
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+
+    @property
+    def throttles_bandwidth(self) -> bool:
+        """True if any bandwidth budget is configured."""
+        return self.per_ip_bandwidth > 0 or self.global_bandwidth.rate > 0
+
+    def metrics(self) -> Dict:
+        """Return a snapshot of admission counters."""
+        with self._cond:
+            snapshot = dict(self._metrics, shed=dict(self._metrics['shed']))
+            snapshot['active'] = self._active
+            snapshot['waiting'] = self._waiting
+            snapshot['tracked_clients'] = len(self._clients)
+        snapshot['shed_total'] = sum(snapshot['shed'].values())
+        return snapshot
+
+    def _client(self, client: str) -> _ClientState:
+        # Caller holds self._cond
+        now = time.monotonic()
+        if now - self._last_cleanup > CLEANUP_INTERVAL:
+            self._last_cleanup = now
+            for key in [k for k, s in self._clients.items()
+                        if s.active == 0 and now - s.last_seen > CLIENT_IDLE_TIMEOUT]:
+                del self._clients[key]
+
+        state = self._clients.get(client)
+        if state is None:
+            state = _ClientState(self.per_ip_rate, self.per_ip_burst, self.per_ip_bandwidth)
+            self._clients[client] = state
+        state.last_seen = now
+        return state
+
+    def _release(self, client: str) -> None:
+        with self._cond:
+            state = self._clients.get(client)
+            if state is not None:
+                state.active -= 1
+                state.last_seen = time.monotonic()
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _shed(self, reason: str) -> None:
+        with self._cond:
+            self._metrics['shed'][reason] += 1
+
+    def _enter_queue(self) -> None:
+        with self._cond:
+            self._enter_queue_locked()
+
+    def _enter_queue_locked(self) -> None:
+        # Caller holds self._cond
+        if self._waiting >= self.max_queue:
+            self._metrics['shed']['queue_full'] += 1
+            raise Rejection('Server is busy', BUSY_RETRY_AFTER, 503)
+        self._waiting += 1
+
+    def _leave_queue(self) -> None:
+        with self._cond:
+            self._waiting -= 1
+
+    def _record_queue_wait(self, seconds: float) -> None:
+        with self._cond:
+            self._metrics['queued'] += 1
+            self._metrics['queue_wait_seconds'] += seconds
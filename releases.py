@@ -0,0 +1,340 @@
+import os
+import gzip
+import json
+import time
+import uuid
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+import shutil
+
+from file_manager import (
+    generate_patchlist_from_status, create_directory_if_not_exists, HASH_CHUNK_SIZE, ProgressCallback
+)
+
+logger = logging.getLogger('releases')
+
+# Files making up a release snapshot
+RELEASE_INFO = 'release.json'
+RELEASE_STATUS = 'file_status.json'
+RELEASE_PATCHLIST = 'patcher.txt'
+RELEASE_MANIFEST = 'patcher.bin'
+COMPRESSED_VARIANTS = [RELEASE_PATCHLIST, RELEASE_MANIFEST]
+
+CURRENT_POINTER = 'current'
+
+# Content-addressed copies of the released files, shared by all releases
+OBJECTS_DIR = 'objects'
+# Unreferenced objects younger than this may belong to a publish running in another process
+OBJECT_GRACE_PERIOD = 3600  # seconds
+
+
+class ReleaseError(Exception):
+    """Raised when the draft catalog cannot be frozen into a release."""
+
+
+def patch_path(filename: str, details: Dict) -> str:
+    """Return the path of a catalog entry as listed in the patchlist."""
+    return f"{details['folder']}/{filename}" if details['folder'] != 'main' else filename
+
+
+class ReleaseStore:
+    """
+    Immutable catalog snapshots with an atomically swapped current pointer.
+
+    The file status acts as the draft catalog. publish() freezes it into a
+    new release directory holding the patchlist, binary manifest and their
+    gzip variants, then points 'current' at it. The bytes of every released
+    file are copied into a content-addressed object store, so uploads and
+    deletions in the upload folder don't affect what clients download until
+    the next publish. Older releases, and the objects they reference, are
+    kept for rollback up to the retention limit.
+    """
+
+    def __init__(self, releases_dir: str, upload_folder: str, retention: int = 10):
+        self.releases_dir = releases_dir
+        self.upload_folder = upload_folder
+        self.retention = retention
+        self._index: Tuple[Optional[str], Dict[str, str]] = (None, {})
+        create_directory_if_not_exists(os.path.join(releases_dir, OBJECTS_DIR))
+
+    def path(self, release_id: str, name: str = '') -> str:
+        """Return the path of a file inside a release directory."""
+        return os.path.join(self.releases_dir, release_id, name)
+
+    def object_path(self, sha256: str) -> str:
+        """Return the path of a stored file by its SHA256."""
+        return os.path.join(self.releases_dir, OBJECTS_DIR, sha256[:2], sha256)
+
+    def current_id(self) -> Optional[str]:
+        """Return the ID of the served release, or None if nothing is published."""
+        try:
+            with open(os.path.join(self.releases_dir, CURRENT_POINTER), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def get(self, release_id: str) -> Optional[Dict]:
+        """Return the metadata of a release, or None if it doesn't exist."""
+        try:
+            with open(self.path(release_id, RELEASE_INFO), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def current(self) -> Optional[Dict]:
+        """Return the metadata of the served release."""
+        release_id = self.current_id()
+        return self.get(release_id) if release_id else None
+
+    def current_status(self) -> Dict:
+        """Return the frozen file status of the served release."""
+        release_id = self.current_id()
+        if not release_id:
+            return {}
+        with open(self.path(release_id, RELEASE_STATUS), 'r') as f:
+            return json.load(f)
+
+    def resolve(self, path: str) -> Optional[Tuple[str, str]]:
+        """
+        Find a file of the served release.
+
+        Args:
+            path: Path as listed in the patchlist
+
+        Returns:
+            (stored file path, sha256), or None if the served release doesn't list it
+        """
+        release_id = self.current_id()
+        if release_id is None:
+            return None
+        
+        cached_id, index = self._index
+        if cached_id != release_id:
+            index = {
+                patch_path(filename, details): details['sha256']
+                for filename, details in self.current_status().items()
+                if details.get('status') == 'ON'
+            }
+            self._index = (release_id, index)
+        
+        sha256 = index.get(path)
+        if sha256 is None:
+            return None
+        return self.object_path(sha256), sha256
+
+    def missing_files(self, file_status: Dict) -> List[str]:
+        """Return the 'ON' entries whose file is neither stored nor in the upload folder."""
+        return [
+            filename for filename, details in file_status.items()
+            if details.get('status') == 'ON'
+            and not os.path.exists(self.object_path(details['sha256']))
+            and not os.path.exists(os.path.join(self.upload_folder, details['folder'], filename))
+        ]
+
+    def store_objects(self, file_status: Dict,
+                      progress_callback: Optional[ProgressCallback] = None) -> Tuple[int, List[str]]:
+        """
+        Copy the files of all 'ON' entries into the object store.
+
+        Files already stored are skipped, as are files missing from the
+        upload folder. Each copy is hashed while it is written and must
+        match the SHA256 recorded in the file status.
+
+        Args:
+            file_status: File status dictionary
+            progress_callback: Optional callback(bytes done, bytes total),
+                invoked per copied chunk; may raise to abort
+
+        Returns:
+            Tuple of (number of files copied, names of missing files)
+        """
+        pending = []
+        missing = []
+        for filename, details in file_status.items():
+            if details.get('status') != 'ON' or os.path.exists(self.object_path(details['sha256'])):
+                continue
+            source = os.path.join(self.upload_folder, details['folder'], filename)
+            if os.path.exists(source):
+                pending.append((filename, details, source))
+            else:
+                missing.append(filename)
+        
+        total = sum(details.get('size', 0) for _, details, _ in pending)
+        done = 0
+        copied = 0
+        for filename, details, source in pending:
+            target = self.object_path(details['sha256'])
+            create_directory_if_not_exists(os.path.dirname(target))
+            temp_file = os.path.join(os.path.dirname(target), f".{details['sha256']}.{os.getpid()}.tmp")
+            sha256_hash = hashlib.sha256()
+            try:
+                with open(source, 'rb') as f_in, open(temp_file, 'wb') as f_out:
+                    for chunk in iter(lambda: f_in.read(HASH_CHUNK_SIZE), b""):
+                        sha256_hash.update(chunk)
+                        f_out.write(chunk)
+                        done += len(chunk)
+                        if progress_callback:
+                            progress_callback(min(done, total), total)
+                if sha256_hash.hexdigest() != details['sha256']:
+                    raise ReleaseError(f"{filename} changed since it was hashed, rescan before publishing")
+                os.replace(temp_file, target)
+            finally:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+            copied += 1
+        return copied, missing
+
+    def list_releases(self) -> List[Dict]:
+        """Return all retained releases, newest first."""
+        releases = []
+        for entry in os.scandir(self.releases_dir):
+            if entry.is_dir() and not entry.name.startswith('.') and entry.name != OBJECTS_DIR:
+                info = self.get(entry.name)
+                if info:
+                    releases.append(info)
+        return sorted(releases, key=lambda r: r['timestamp'], reverse=True)
+
+    def publish(self, file_status: Dict, note: str = '',
+                progress_callback: Optional[ProgressCallback] = None) -> Dict:
+        """
+        Freeze the draft catalog into a new release and make it current.
+
+        Entries whose file is missing from disk are left out of the release
+        and listed under 'skipped' in its metadata. If the resulting
+        patchlist is identical to the current release, no new release is
+        created and the current one is returned.
+
+        Args:
+            file_status: Draft file status dictionary
+            note: Optional description stored with the release
+            progress_callback: Optional callback(done, total) while files are
+                copied into the object store; may raise to abort the publish
+
+        Returns:
+            Metadata of the current release
+        """
+        now = datetime.now()
+        release_id = f"{now.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        staging_dir = os.path.join(self.releases_dir, f".{release_id}")
+        create_directory_if_not_exists(staging_dir)
+
+        try:
+            # The staged status marks its objects as in use before they are stored (see _prune)
+            with open(os.path.join(staging_dir, RELEASE_STATUS), 'w') as f:
+                json.dump(file_status, f, indent=2)
+            copied, missing = self.store_objects(file_status, progress_callback)
+            if missing:
+                logger.warning("Leaving %s missing files out of the release: %s", len(missing), ', '.join(missing))
+                file_status = {
+                    filename: dict(details, status='OFF') if filename in missing else details
+                    for filename, details in file_status.items()
+                }
+                with open(os.path.join(staging_dir, RELEASE_STATUS), 'w') as f:
+                    json.dump(file_status, f, indent=2)
+            
+            if not generate_patchlist_from_status(
+                file_status,
+                os.path.join(staging_dir, RELEASE_PATCHLIST),
+                os.path.join(staging_dir, RELEASE_MANIFEST)
+            ):
+                raise RuntimeError("Patchlist generation failed")
+
+            with open(os.path.join(staging_dir, RELEASE_PATCHLIST), 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            current = self.current()
+            if current and current['digest'] == digest:
+                shutil.rmtree(staging_dir)
+                logger.info("Publish skipped, catalog unchanged since release %s", current['id'])
+                return current
+
+            for name in COMPRESSED_VARIANTS:
+                source = os.path.join(staging_dir, name)
+                with open(source, 'rb') as f_in, gzip.open(f"{source}.gz", 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+
+            active = [d for d in file_status.values() if d.get('status') == 'ON']
+            info = {
+                'id': release_id,
+                'created': now.strftime("%Y-%m-%d %H:%M:%S"),
+                'timestamp': now.timestamp(),
+                'note': note,
+                'digest': digest,
+                'files': len(active),
+                'total_size': sum(d.get('size', 0) for d in active),
+                'skipped': missing,
+            }
+            with open(os.path.join(staging_dir, RELEASE_INFO), 'w') as f:
+                json.dump(info, f, indent=2)
+
+            # Rename into place: a release directory is complete or absent
+            os.rename(staging_dir, self.path(release_id))
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        self._set_current(release_id)
+        self._prune()
+        logger.info("Published release %s with %s files (%s new)", release_id, info['files'], copied)
+        return info
+
+    def rollback(self, release_id: str) -> Dict:
+        """
+        Serve a previously published release again.
+
+        Args:
+            release_id: ID of a retained release
+
+        Returns:
+            Metadata of the release
+        """
+        info = self.get(release_id)
+        if info is None:
+            raise KeyError(f"Unknown release: {release_id}")
+        self._set_current(release_id)
+        logger.info("Rolled back to release %s", release_id)
+        return info
+
+    def _set_current(self, release_id: str) -> None:
+        pointer = os.path.join(self.releases_dir, CURRENT_POINTER)
+        temp_file = f"{pointer}.{os.getpid()}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(release_id)
+        os.replace(temp_file, pointer)
+
+    def _prune(self) -> None:
+        current_id = self.current_id()
+        for info in self.list_releases()[self.retention:]:
+            if info['id'] != current_id:
+                shutil.rmtree(self.path(info['id']), ignore_errors=True)
+                logger.info("Pruned release %s", info['id'])
+        
+        # Drop objects no retained or in-progress release refers to
+        referenced = self._referenced_objects()
+        objects_dir = os.path.join(self.releases_dir, OBJECTS_DIR)
+        cutoff = time.time() - OBJECT_GRACE_PERIOD
+        removed = 0
+        for bucket in os.scandir(objects_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                # Also catches temp files left by interrupted copies
+                if entry.name not in referenced and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+        if removed:
+            logger.info("Removed %s unreferenced objects", removed)
+
+    def _referenced_objects(self) -> Set[str]:
+        referenced: Set[str] = set()
+        for entry in os.scandir(self.releases_dir):
+            if not entry.is_dir() or entry.name == OBJECTS_DIR:
+                continue
+            try:
+                with open(os.path.join(entry.path, RELEASE_STATUS), 'r') as f:
+                    file_status = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            referenced.update(d['sha256'] for d in file_status.values() if d.get('status') == 'ON')
+        return referenced
@@ -0,0 +1,200 @@
+import os
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, NamedTuple, Optional, Pattern, Tuple
+
+logger = logging.getLogger('scanner')
+
+DEFAULT_EXCLUSIONS = [
+    # VCS and editor metadata
+    '.git', '__pycache__', '.vscode', '.idea',
+    # OS metadata
+    '.DS_Store', '._*', 'Thumbs.db', 'desktop.ini',
+    # Partial uploads and atomic-write temp files
+    '*.tmp', '*.part', '*.partial',
+]
+
+
+class ScanEntry(NamedTuple):
+    """A file found by the scanner, with the stat data already collected."""
+    relative_path: str  # '/'-separated, relative to the scan root
+    path: str
+    size: int
+    mtime: float
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore-style glob (without anchoring) to a regex body."""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 3] == '**/':
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            start = i + 1
+            negate = pattern[start:start + 1] in ('!', '^')
+            if negate:
+                start += 1
+            # A ']' right after '[' or '[!' is a member, not the end of the set
+            end = pattern.find(']', start + 1 if pattern[start:start + 1] == ']' else start)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = ''.join('\\' + ch if ch in '\\[]^&~|' else ch for ch in pattern[start:end])
+                out.append(f'[^/{body}]' if negate else f'[{body}]')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class ExclusionMatcher:
+    """
+    Match '/'-separated relative paths against gitignore-style patterns.
+
+    Patterns are compiled once. Semantics follow .gitignore:
+      - a pattern without a slash matches a name at any depth ('*.log')
+      - a leading or inner slash anchors it to the scan root ('/build', 'pack/tmp')
+      - a trailing slash matches directories only ('cache/')
+      - '*', '?', '[...]' do not cross '/', '**' does
+      - '!' re-includes a path excluded by an earlier pattern
+    Excluding a directory excludes everything beneath it.
+    """
+
+    def __init__(self, patterns: Optional[List[str]] = None):
+        self.rules: List[Tuple[Pattern, bool, bool]] = []
+        for raw in patterns or []:
+            pattern = raw.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+
+            negate = pattern.startswith('!')
+            if negate:
+                pattern = pattern[1:]
+            dir_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if not pattern:
+                continue
+
+            if '/' in pattern:
+                regex = _translate_glob(pattern.lstrip('/'))
+            else:
+                regex = '(?:.*/)?' + _translate_glob(pattern)
+            self.rules.append((re.compile(regex + r'\Z'), negate, dir_only))
+
+        # Without negations every rule has the same effect, so fold them into
+        # one alternation per kind and match with a single regex call.
+        self._combined = None
+        if not any(negate for _, negate, _ in self.rules):
+            any_kind = [r.pattern for r, _, dir_only in self.rules if not dir_only]
+            dirs_only = [r.pattern for r, _, dir_only in self.rules if dir_only]
+            self._combined = (
+                re.compile('|'.join(f'(?:{p})' for p in any_kind)) if any_kind else None,
+                re.compile('|'.join(f'(?:{p})' for p in dirs_only)) if dirs_only else None,
+            )
+
+    def is_excluded(self, relative_path: str, is_dir: bool = False) -> bool:
+        """
+        Check whether a path is excluded.
+
+        Args:
+            relative_path: '/'-separated path relative to the scan root
+            is_dir: Whether the path is a directory
+
+        Returns:
+            True if the path should be skipped
+        """
+        if self._combined is not None:
+            any_kind, dirs_only = self._combined
+            if any_kind is not None and any_kind.match(relative_path):
+                return True
+            return bool(is_dir and dirs_only is not None and dirs_only.match(relative_path))
+
+        excluded = False
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                excluded = not negate
+        return excluded
+
+
+def _scan_one(path: str, prefix: str, matcher: ExclusionMatcher) -> Tuple[List[ScanEntry], List[Tuple[str, str]]]:
+    """Scan a single directory, returning its files and subdirectories to visit."""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                relative_path = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not matcher.is_excluded(relative_path, is_dir=True):
+                            subdirs.append((entry.path, relative_path + '/'))
+                    elif entry.is_file():
+                        if not matcher.is_excluded(relative_path):
+                            st = entry.stat()
+                            files.append(ScanEntry(relative_path, entry.path, st.st_size, st.st_mtime))
+                except OSError as e:
+                    logger.error("Error reading %s: %s", entry.path, e)
+    except OSError as e:
+        logger.error("Error scanning %s: %s", path, e)
+    return files, subdirs
+
+def scan_directory(root: str, exclusions: Optional[List[str]] = None,
+                   max_workers: Optional[int] = None, recursive: bool = True) -> List[ScanEntry]:
+    """
+    Recursively list files under root, skipping excluded paths.
+
+    Directories are scanned in parallel with os.scandir; stat results are
+    collected during the scan so callers don't need to stat again.
+
+    Args:
+        root: Directory to scan
+        exclusions: gitignore-style patterns (see ExclusionMatcher);
+            defaults to DEFAULT_EXCLUSIONS
+        max_workers: Scanner threads (default: min(32, cpu_count * 2))
+        recursive: Descend into subdirectories; if False only files directly
+            under root are listed
+
+    Returns:
+        List of ScanEntry sorted by relative path
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Target folder does not exist: {root}")
+
+    matcher = ExclusionMatcher(DEFAULT_EXCLUSIONS if exclusions is None else exclusions)
+    workers = max_workers or min(32, (os.cpu_count() or 1) * 2)
+    results: List[ScanEntry] = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_scan_one, root, '', matcher)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                results.extend(files)
+                if not recursive:
+                    continue
+                for path, prefix in subdirs:
+                    pending.add(executor.submit(_scan_one, path, prefix, matcher))
+
+    results.sort(key=lambda e: e.relative_path)
+    logger.info("Scanned %s: %s files", root, len(results))
+    return results
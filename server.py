@@ -3,34 +3,40 @@ import sys
 import argparse
 import logging
 import secrets
+import importlib.util
 from dotenv import load_dotenv
 import psutil
 
 # Load environment variables
 load_dotenv()
 
-def check_requirements():
-    """Check if all required packages are installed."""
-    try:
-        import flask
-        import werkzeug
-        import flask_wtf
-        import flask_cors
-        import gunicorn
+def check_requirements(production=False):
+    """
+    Check if all required packages are installed.
+    
+    Packages are located without importing them, so the check doesn't add
+    their import time to startup.
+    """
+    packages = ['flask', 'werkzeug', 'flask_wtf', 'flask_cors']
+    if production:
+        packages.append('gunicorn')
+    
+    missing = [name for name in packages if importlib.util.find_spec(name) is None]
+    if not missing:
         print("✓ All dependencies found")
         return True
-    except ImportError as e:
-        print(f"✗ Missing dependency: {e}")
-        print("Installing required dependencies...")
-        
-        try:
-            import pip
-            pip.main(['install', '-r', 'requirements.txt'])
-            print("✓ Dependencies installed successfully")
-            return True
-        except Exception as e:
-            print(f"✗ Failed to install dependencies: {e}")
-            return False
+    
+    print(f"✗ Missing dependency: {', '.join(missing)}")
+    print("Installing required dependencies...")
+    
+    try:
+        import pip
+        pip.main(['install', '-r', 'requirements.txt'])
+        print("✓ Dependencies installed successfully")
+        return True
+    except Exception as e:
+        print(f"✗ Failed to install dependencies: {e}")
+        return False
 
 def check_system_resources():
     """Check if system has sufficient resources."""
@@ -103,7 +109,7 @@ def run_development_server():
     print(f"Starting development server on {host}:{port} (debug={debug})")
     app.run(host=host, port=port, debug=debug, use_reloader=True)
 
-def run_production_server(workers):
+def run_production_server(workers, threads):
     """Run the Gunicorn production server."""
     host = os.environ.get('HOST', '0.0.0.0')
     port = int(os.environ.get('PORT', 5000))
@@ -113,19 +119,37 @@ def run_production_server(workers):
         # Gunicorn recommends (2 x $num_cores) + 1
         workers = (psutil.cpu_count() * 2) + 1
     
-    print(f"Starting production server on {host}:{port} with {workers} workers")
+    # Download admission control queues and paces requests inside the worker,
+    # so each worker needs threads to spare beyond the download cap
+    global_concurrency = int(os.environ.get('RATE_LIMIT_GLOBAL_CONCURRENCY', 24))
+    max_queue = int(os.environ.get('RATE_LIMIT_MAX_QUEUE', 6))
+    if global_concurrency + max_queue >= threads:
+        print(f"⚠ Warning: RATE_LIMIT_GLOBAL_CONCURRENCY ({global_concurrency}) plus RATE_LIMIT_MAX_QUEUE "
+              f"({max_queue}) should be below --threads ({threads}), or downloads can occupy every thread")
+    
+    print(f"Starting production server on {host}:{port} with {workers} workers x {threads} threads")
     
     # Build command for subprocess
     cmd = [
         'gunicorn',
         '--bind', f'{host}:{port}',
         '--workers', str(workers),
+        # Threaded workers: concurrent downloads per process, and long paced
+        # downloads don't block the heartbeat that the worker timeout watches
+        '--worker-class', 'gthread',
+        '--threads', str(threads),
         '--log-level', 'info',
         '--access-logfile', 'access.log',
         '--error-logfile', 'error.log',
+        # Load the app once in the master; workers fork with imports,
+        # templates and the initial release already in place
+        '--preload',
         'app:app'
     ]
     
+    # Tells the app to elect the scheduler leader among the forked workers
+    os.environ['PRELOAD_APP'] = 'true'
+    
     # Execute gunicorn
     os.execvp('gunicorn', cmd)
 
@@ -135,6 +159,8 @@ def main():
     parser.add_argument('--dev', action='store_true', help='Run in development mode')
     parser.add_argument('--prod', action='store_true', help='Run in production mode')
     parser.add_argument('--workers', type=int, default=0, help='Number of Gunicorn workers (production only)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WORKER_THREADS', 32)),
+                        help='Threads per Gunicorn worker (production only)')
     parser.add_argument('--setup', action='store_true', help='Setup environment only')
     
     args = parser.parse_args()
@@ -143,7 +169,7 @@ def main():
     print("==================================")
     
     # Check requirements
-    if not check_requirements():
+    if not check_requirements(production=args.prod):
         return 1
     
     # Check system resources
@@ -167,7 +193,7 @@ def main():
     if args.dev:
         run_development_server()
     elif args.prod:
-        run_production_server(args.workers)
+        run_production_server(args.workers, args.threads)
     else:
         # Default to development mode
         print("No mode specified, defaulting to development mode")
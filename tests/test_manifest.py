@@ -0,0 +1,102 @@
+import hashlib
+import unicodedata
+
+import pytest
+
+from manifest import (
+    HEADER, MANIFEST_MAGIC, Manifest, ManifestError, encode_manifest, read_manifest, write_manifest
+)
+
+
+def digest(data):
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+ENTRIES = [
+    ('pack/root.eix', digest('root'), 1024),
+    ('metin2.exe', digest('client'), 5 * 1024 * 1024 * 1024),
+    ('pack/ärger/karte.epk', digest('map'), 0),
+    ('custom/日本語.txt', digest('text'), 42),
+    ('pack/root.epk', digest('root data'), 7),
+]
+
+
+def test_round_trip_yields_entries_sorted_by_path_bytes():
+    manifest = Manifest(encode_manifest(ENTRIES))
+
+    assert len(manifest) == len(ENTRIES)
+    assert list(manifest) == sorted(ENTRIES, key=lambda entry: entry[0].encode('utf-8'))
+
+
+def test_lookup_hits_and_misses():
+    manifest = Manifest(encode_manifest(ENTRIES))
+
+    for path, sha256, size in ENTRIES:
+        assert manifest.lookup(path) == (sha256, size)
+        assert path in manifest
+
+    assert manifest.lookup('pack/root') is None
+    assert manifest.lookup('pack/root.eix ') is None
+    assert manifest.lookup('') is None
+    assert manifest.lookup('zzz') is None
+    assert 'pack/ärger' not in manifest
+
+
+def test_non_ascii_paths_survive_round_trip():
+    manifest = Manifest(encode_manifest(ENTRIES))
+
+    assert manifest.lookup('custom/日本語.txt') == (digest('text'), 42)
+    assert manifest.lookup('pack/ärger/karte.epk') == (digest('map'), 0)
+    # NFD spelling is a different byte sequence and must not match
+    assert manifest.lookup(unicodedata.normalize('NFD', 'pack/ärger/karte.epk')) is None
+
+
+def test_empty_manifest():
+    data = encode_manifest([])
+    manifest = Manifest(data)
+
+    assert len(data) == HEADER.size
+    assert len(manifest) == 0
+    assert list(manifest) == []
+    assert manifest.lookup('anything') is None
+
+
+def test_write_and_read_manifest(tmp_path):
+    output_file = tmp_path / 'patcher.bin'
+    write_manifest(ENTRIES, str(output_file))
+
+    assert list(read_manifest(str(output_file))) == list(Manifest(encode_manifest(ENTRIES)))
+    assert not (tmp_path / 'patcher.bin.tmp').exists()
+
+
+def test_duplicate_path_is_rejected():
+    with pytest.raises(ManifestError, match='Duplicate path'):
+        encode_manifest(ENTRIES + [('metin2.exe', digest('other'), 1)])
+
+
+def test_invalid_digest_is_rejected():
+    with pytest.raises(ManifestError, match='Invalid SHA256'):
+        encode_manifest([('metin2.exe', 'abcd', 1)])
+
+
+@pytest.mark.parametrize('cut', [0, 1, HEADER.size - 1, HEADER.size, -1])
+def test_truncated_buffer_is_rejected(cut):
+    data = encode_manifest(ENTRIES)
+
+    with pytest.raises(ManifestError):
+        Manifest(data[:cut])
+
+
+def test_bad_magic_is_rejected():
+    data = encode_manifest(ENTRIES)
+
+    with pytest.raises(ManifestError, match='Not a patchlist manifest'):
+        Manifest(b'NOPE' + data[len(MANIFEST_MAGIC):])
+
+
+def test_bad_version_is_rejected():
+    data = bytearray(encode_manifest(ENTRIES))
+    data[4:6] = (2).to_bytes(2, 'little')
+
+    with pytest.raises(ManifestError, match='Unsupported manifest version: 2'):
+        Manifest(bytes(data))
@@ -0,0 +1,187 @@
+import threading
+import time
+
+import pytest
+
+from rate_limit import (
+    BUSY_RETRY_AFTER, MODE_QUEUE, MODE_REJECT, AdmissionController, Rejection, TokenBucket
+)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.005)
+
+
+def test_token_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(rate=10.0, burst=3.0)
+
+    assert [bucket.try_consume() for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = bucket.try_consume()
+    assert 0 < wait <= 0.1
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=100.0, burst=1.0)
+    assert bucket.try_consume() == 0.0
+
+    time.sleep(0.03)
+
+    assert bucket.try_consume() == 0.0
+
+
+def test_token_bucket_zero_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, burst=1.0)
+
+    assert all(bucket.try_consume() == 0.0 for _ in range(100))
+    bucket.consume(10 ** 9)
+
+
+def test_token_bucket_consume_sleeps_off_debt():
+    bucket = TokenBucket(rate=100.0, burst=1.0)
+
+    started = time.monotonic()
+    bucket.consume(4.0)
+
+    assert time.monotonic() - started >= 0.025
+
+
+def test_admit_and_release_track_active_downloads():
+    controller = AdmissionController(per_ip_rate=0, global_concurrency=2)
+
+    ticket = controller.admit('10.0.0.1')
+    assert controller.metrics()['active'] == 1
+
+    ticket.release()
+    ticket.release()
+    metrics = controller.metrics()
+    assert metrics['active'] == 0
+    assert metrics['admitted'] == 1
+
+
+def test_reject_mode_sheds_client_over_rate_with_429():
+    controller = AdmissionController(per_ip_rate=1.0, per_ip_burst=1.0, mode=MODE_REJECT)
+    controller.admit('10.0.0.1').release()
+
+    with pytest.raises(Rejection) as excinfo:
+        controller.admit('10.0.0.1')
+
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after > 0
+    assert controller.metrics()['shed']['client_rate'] == 1
+    # Other clients have their own bucket
+    controller.admit('10.0.0.2').release()
+
+
+def test_reject_mode_sheds_over_concurrency_caps():
+    controller = AdmissionController(per_ip_rate=0, per_ip_concurrency=1,
+                                     global_concurrency=2, mode=MODE_REJECT)
+    controller.admit('10.0.0.1')
+
+    with pytest.raises(Rejection) as excinfo:
+        controller.admit('10.0.0.1')
+    assert excinfo.value.status_code == 429
+
+    controller.admit('10.0.0.2')
+    with pytest.raises(Rejection) as excinfo:
+        controller.admit('10.0.0.3')
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.retry_after == BUSY_RETRY_AFTER
+
+    shed = controller.metrics()['shed']
+    assert shed['client_concurrency'] == 1
+    assert shed['global_concurrency'] == 1
+
+
+def test_queue_mode_admits_waiter_when_slot_frees():
+    controller = AdmissionController(per_ip_rate=0, global_concurrency=1,
+                                     mode=MODE_QUEUE, queue_timeout=2.0)
+    first = controller.admit('10.0.0.1')
+    admitted = []
+
+    waiter = threading.Thread(target=lambda: admitted.append(controller.admit('10.0.0.2')))
+    waiter.start()
+    wait_until(lambda: controller.metrics()['waiting'] == 1)
+    first.release()
+    waiter.join(2.0)
+
+    assert len(admitted) == 1
+    metrics = controller.metrics()
+    assert metrics['waiting'] == 0
+    assert metrics['queued'] == 1
+    assert metrics['active'] == 1
+
+
+def test_queue_mode_sheds_after_timeout():
+    controller = AdmissionController(per_ip_rate=0, global_concurrency=1,
+                                     mode=MODE_QUEUE, queue_timeout=0.05)
+    controller.admit('10.0.0.1')
+
+    with pytest.raises(Rejection) as excinfo:
+        controller.admit('10.0.0.2')
+
+    assert excinfo.value.status_code == 503
+    metrics = controller.metrics()
+    assert metrics['shed']['global_concurrency'] == 1
+    assert metrics['waiting'] == 0
+
+
+def test_queue_mode_sheds_immediately_when_queue_is_full():
+    controller = AdmissionController(per_ip_rate=0, global_concurrency=1, mode=MODE_QUEUE,
+                                     queue_timeout=5.0, max_queue=1)
+    first = controller.admit('10.0.0.1')
+    waiter = threading.Thread(target=lambda: controller.admit('10.0.0.2'))
+    waiter.start()
+    wait_until(lambda: controller.metrics()['waiting'] == 1)
+
+    started = time.monotonic()
+    with pytest.raises(Rejection) as excinfo:
+        controller.admit('10.0.0.3')
+
+    assert time.monotonic() - started < 1.0
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.retry_after == BUSY_RETRY_AFTER
+    assert controller.metrics()['shed']['queue_full'] == 1
+
+    first.release()
+    waiter.join(2.0)
+    assert controller.metrics()['waiting'] == 0
+
+
+def test_queue_full_also_applies_to_rate_waits():
+    controller = AdmissionController(per_ip_rate=10.0, per_ip_burst=1.0, mode=MODE_QUEUE,
+                                     queue_timeout=5.0, max_queue=0)
+    controller.admit('10.0.0.1').release()
+
+    with pytest.raises(Rejection) as excinfo:
+        controller.admit('10.0.0.1')
+
+    assert excinfo.value.status_code == 503
+    metrics = controller.metrics()
+    assert metrics['shed']['queue_full'] == 1
+    assert metrics['waiting'] == 0
+
+
+def test_throttle_passes_chunks_and_counts_bytes():
+    controller = AdmissionController(per_ip_rate=0, per_ip_bandwidth=1 << 20)
+    closed = []
+
+    class Body:
+        def __iter__(self):
+            return iter([b'abc', b'defg'])
+
+        def close(self):
+            closed.append(True)
+
+    assert controller.throttles_bandwidth
+    assert list(controller.throttle(Body(), '10.0.0.1')) == [b'abc', b'defg']
+    assert controller.metrics()['bytes_sent'] == 7
+    assert closed == [True]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        AdmissionController(mode='drop')
@@ -0,0 +1,132 @@
+import os
+
+import pytest
+
+from scanner import DEFAULT_EXCLUSIONS, ExclusionMatcher, scan_directory
+
+
+def excluded(patterns, path, is_dir=False):
+    return ExclusionMatcher(patterns).is_excluded(path, is_dir)
+
+
+def test_unanchored_pattern_matches_at_any_depth():
+    assert excluded(['*.tmp'], 'a.tmp')
+    assert excluded(['*.tmp'], 'pack/deep/a.tmp')
+    assert not excluded(['*.tmp'], 'a.tmp.epk')
+
+
+def test_slash_anchors_pattern_to_root():
+    assert excluded(['/build'], 'build')
+    assert not excluded(['/build'], 'pack/build')
+    assert excluded(['pack/tmp'], 'pack/tmp')
+    assert not excluded(['pack/tmp'], 'other/pack/tmp')
+
+
+def test_star_and_question_mark_do_not_cross_slash():
+    assert not excluded(['pack/*.epk'], 'pack/sub/a.epk')
+    assert excluded(['pack/?.epk'], 'pack/a.epk')
+    assert not excluded(['pack/?.epk'], 'pack/ab.epk')
+
+
+def test_double_star_crosses_directories():
+    assert excluded(['pack/**/*.bak'], 'pack/a.bak')
+    assert excluded(['pack/**/*.bak'], 'pack/x/y/a.bak')
+    assert excluded(['logs/**'], 'logs/2024/01.txt')
+    assert not excluded(['pack/**/*.bak'], 'other/a.bak')
+
+
+def test_trailing_slash_matches_directories_only():
+    assert excluded(['cache/'], 'cache', is_dir=True)
+    assert excluded(['cache/'], 'pack/cache', is_dir=True)
+    assert not excluded(['cache/'], 'cache')
+
+
+def test_negation_reincludes_earlier_exclusion():
+    patterns = ['*.txt', '!keep.txt']
+
+    assert excluded(patterns, 'notes.txt')
+    assert not excluded(patterns, 'keep.txt')
+    assert not excluded(patterns, 'docs/keep.txt')
+
+
+def test_later_rule_wins_over_negation():
+    assert excluded(['*.txt', '!keep.txt', 'keep.txt'], 'keep.txt')
+
+
+def test_comments_and_blank_lines_are_ignored():
+    matcher = ExclusionMatcher(['# *.epk', '', '   '])
+
+    assert matcher.rules == []
+    assert not matcher.is_excluded('a.epk')
+
+
+def test_git_pattern_does_not_match_similar_names():
+    assert excluded(DEFAULT_EXCLUSIONS, '.git', is_dir=True)
+    assert excluded(DEFAULT_EXCLUSIONS, 'pack/.git', is_dir=True)
+    assert not excluded(DEFAULT_EXCLUSIONS, 'my.gitfile')
+    assert not excluded(DEFAULT_EXCLUSIONS, '.gitignore')
+    assert not excluded(DEFAULT_EXCLUSIONS, 'a.git')
+
+
+def test_bracket_set_and_range():
+    assert excluded(['[ab].epk'], 'a.epk')
+    assert not excluded(['[ab].epk'], 'c.epk')
+    assert excluded(['v[0-9].txt'], 'v7.txt')
+    assert not excluded(['v[0-9].txt'], 'vx.txt')
+
+
+def test_negated_bracket_set_does_not_match_slash():
+    assert excluded(['a[!x]b'], 'acb')
+    assert not excluded(['a[!x]b'], 'axb')
+    assert not excluded(['a[!x]b'], 'a/b')
+
+
+@pytest.mark.parametrize('pattern, matches, misses', [
+    ('[]abc]', [']', 'a', 'c'], ['x', '[]abc]']),
+    ('[!]abc]', ['x'], [']', 'a']),
+    ('[^]]', ['x'], [']']),
+    ('[!]', ['[!]'], ['x', '!']),
+    ('[]', ['[]'], ['x']),
+    ('[abc', ['[abc'], ['a']),
+    ('[[]', ['['], ['x']),
+    ('[&~|^]', ['&', '~', '|', '^'], ['x']),
+])
+def test_bracket_edge_cases(pattern, matches, misses):
+    matcher = ExclusionMatcher([pattern])
+
+    for path in matches:
+        assert matcher.is_excluded(path), path
+    for path in misses:
+        assert not matcher.is_excluded(path), path
+
+
+def test_scan_directory_skips_excluded_paths(tmp_path):
+    for relative in ('a.epk', 'my.gitfile', 'pack/b.epk', 'pack/c.tmp',
+                     '.git/config', 'cache/x.epk', 'cache.epk'):
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'data')
+
+    entries = scan_directory(str(tmp_path), DEFAULT_EXCLUSIONS + ['cache/'], max_workers=2)
+
+    assert [e.relative_path for e in entries] == [
+        'a.epk', 'cache.epk', 'my.gitfile', 'pack/b.epk'
+    ]
+    entry = entries[0]
+    assert entry.path == os.path.join(str(tmp_path), 'a.epk')
+    assert entry.size == 4
+
+
+def test_scan_directory_non_recursive_lists_top_level_files(tmp_path):
+    (tmp_path / 'a.epk').write_bytes(b'a')
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'b.epk').write_bytes(b'b')
+
+    entries = scan_directory(str(tmp_path), [], recursive=False)
+
+    assert [e.relative_path for e in entries] == ['a.epk']
+
+
+def test_scan_directory_missing_root_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        scan_directory(str(tmp_path / 'missing'))
@@ -1,7 +1,7 @@
 from flask import render_template, redirect, url_for, flash, request
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import check_password_hash
-from app import app, db, login_manager
+from app import app, db, login_manager, get_job_manager
 from models import User
 from forms import LoginForm
 from file_manager import generate_filelist, save_filelist
@@ -57,7 +57,6 @@ def upload():
 @app.route('/generate')
 @login_required
 def generate():
-    filelist = generate_filelist(app.config['UPLOAD_FOLDER'])
-    save_filelist(filelist, 'patcher.txt')
-    flash('Patchlist generated successfully')
+    job = get_job_manager().submit('rescan')
+    flash(f'Patchlist generation started (job {job["id"]})')
     return redirect(url_for('dashboard'))